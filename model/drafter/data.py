@@ -4,6 +4,7 @@ Module for getting data
 
 import statistics
 import random
+import collections
 import functools
 import logging
 import time
@@ -13,6 +14,10 @@ import sys
 import os
 import pprint
 import datetime
+import queue
+import shutil
+import atexit
+import threading
 
 from sklearn.preprocessing import LabelBinarizer, MultiLabelBinarizer
 import numpy as np
@@ -72,6 +77,10 @@ class MeanMinMaxEncoder:
     def transform(self, raw_value):
         return (float((raw_value - self.mean) / (self.max - self.min)) / 2 * self.output_range) + 0.5 + self.output_min
 
+    def transform_many(self, raw_values):
+        raw_values = np.asarray(raw_values, dtype=np.float64)
+        return (((raw_values - self.mean) / (self.max - self.min)) / 2 * self.output_range) + 0.5 + self.output_min
+
     # TODO Test this
     def inverse_transform(self, encoded_value):
         without_range = (encoded_value - 0.5 - self.output_min) / self.output_range * 2
@@ -91,6 +100,12 @@ class SineEncoder:
     def transform(self, raw_value):
         return np.sin(2 * np.pi * (raw_value / (self.max - self.min))) * self.output_amplitude + 1 + self.output_min
 
+    def transform_many(self, raw_values):
+        # Few distinct values, and np.sin over an array can round differently
+        # than over a scalar, so transform each distinct value once
+        uniques, inverse = np.unique(np.asarray(raw_values), return_inverse=True)
+        return np.array([self.transform(u) for u in uniques], dtype=np.float64)[inverse]
+
 
 # Cache Data #
 
@@ -99,6 +114,87 @@ MIN_SECONDS_PLAYED_IN_GAME = 12 * 60
 MIN_GAMES_PLAYED_PER_SEASON = 15
 
 
+def calculate_fantasy_scores(
+    points,
+    three_point_field_goals,
+    total_rebounds,
+    assists,
+    steals,
+    blocks,
+    turnovers,
+    seconds_played
+):
+    """
+    Array version of calculate_fantasy_score. Takes a column per stat, where
+    None or nan is a missing stat, and returns a float array with nan where
+    seconds_played is missing.
+    """
+    points = np.array(points, dtype=np.float64)
+    three_point_field_goals = np.array(three_point_field_goals, dtype=np.float64)
+    total_rebounds = np.array(total_rebounds, dtype=np.float64)
+    assists = np.array(assists, dtype=np.float64)
+    steals = np.array(steals, dtype=np.float64)
+    blocks = np.array(blocks, dtype=np.float64)
+    turnovers = np.array(turnovers, dtype=np.float64)
+    seconds_played = np.array(seconds_played, dtype=np.float64)
+
+    with np.errstate(invalid='ignore'):
+        double_double_stat_count = (
+            (points >= 10).astype(np.int64)
+            + (total_rebounds >= 10)
+            + (assists >= 10)
+            + (steals >= 10)
+            + (blocks >= 10)
+        )
+
+    scores = (
+        np.nan_to_num(points)
+        + np.nan_to_num(three_point_field_goals) * 0.5
+        + np.nan_to_num(total_rebounds) * 1.25
+        + np.nan_to_num(assists) * 1.5
+        + np.nan_to_num(steals) * 2
+        + np.nan_to_num(blocks) * 2
+        + np.nan_to_num(turnovers) * -0.5
+        + np.where(double_double_stat_count >= 2, 1.5, 0)
+        + np.where(double_double_stat_count >= 3, 3, 0)
+    )
+
+    scores[seconds_played == 0] = 0
+    scores[np.isnan(seconds_played)] = np.nan
+
+    return scores
+
+
+def calculate_fppms(scores, seconds_played):
+    """
+    Array version of calculate_fppm, from the scores given by
+    calculate_fantasy_scores
+    """
+    scores = np.array(scores, dtype=np.float64)
+    seconds_played = np.array(seconds_played, dtype=np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fppms = scores / (seconds_played / 60)
+
+    fppms[seconds_played == 0] = 0
+
+    return fppms
+
+
+def calculate_fantasy_scores_for_rows(rows):
+    """calculate_fantasy_scores over a list of games_players rows"""
+    return calculate_fantasy_scores(
+        [r['points'] for r in rows],
+        [r['three_point_field_goals'] for r in rows],
+        [r['total_rebounds'] for r in rows],
+        [r['assists'] for r in rows],
+        [r['steals'] for r in rows],
+        [r['blocks'] for r in rows],
+        [r['turnovers'] for r in rows],
+        [r['seconds_played'] for r in rows]
+    )
+
+
 def calculate_fantasy_score(stats):
     if stats['seconds_played'] == None:
         return None
@@ -106,25 +202,7 @@ def calculate_fantasy_score(stats):
     if stats['seconds_played'] == 0:
         return 0
 
-    double_double_stat_count = len(list(filter(lambda s: isinstance(s, int) and s >= 10, [
-        stats['points'],
-        stats['total_rebounds'],
-        stats['assists'],
-        stats['steals'],
-        stats['blocks'],
-    ])))
-
-    return (
-        (stats['points'] or 0)
-        + (stats['three_point_field_goals'] or 0) * 0.5
-        + (stats['total_rebounds'] or 0) * 1.25
-        + (stats['assists'] or 0) * 1.5
-        + (stats['steals'] or 0) * 2
-        + (stats['blocks'] or 0) * 2
-        + (stats['turnovers'] or 0) * -0.5
-        + (1.5 if double_double_stat_count >= 2 else 0)
-        + (3 if double_double_stat_count >= 3 else 0)
-    )
+    return float(calculate_fantasy_scores_for_rows([stats])[0])
 
 
 def calculate_fppm(stats):
@@ -184,7 +262,7 @@ def get_stats_last_games_from_pg(
         )
         and g.time_of_game < datetime('{current_game_date}')
         {team_sql}
-        order by datetime(g.time_of_game) desc
+        order by g.time_of_game desc, g.basketball_reference_id desc
     """).fetchall()
 
     opp_teams_rows = services.sql.execute(
@@ -207,7 +285,7 @@ def get_stats_last_games_from_pg(
             and g.time_of_game < datetime('{current_game_date}')
             {team_sql}
             group by g.id
-            order by datetime(g.time_of_game) desc
+            order by g.time_of_game desc, g.basketball_reference_id desc
         """
     ).fetchall()
 
@@ -234,7 +312,8 @@ def cache_single_games_player(
     opp_team_basketball_reference_id,
     season,
     time_of_game,
-    position
+    position,
+    writer=None
 ):
     assert games_player['player_basketball_reference_id']
 
@@ -272,202 +351,604 @@ def cache_single_games_player(
         home_team=player_team_basketball_reference_id
     )
 
-    services.sql.execute(
-        f'''
-            delete from games_players_computed
-            where game_basketball_reference_id = '{games_player['game_basketball_reference_id']}'
-            and player_basketball_reference_id = '{games_player['player_basketball_reference_id']}'
-        ''')
+    gpc = {
+        'game_basketball_reference_id': games_player['game_basketball_reference_id'],
+        'player_basketball_reference_id': games_player['player_basketball_reference_id'],
 
-    services.sql.execute(
-        f'''
-            insert into games_players_computed (
-                game_basketball_reference_id,
-                player_basketball_reference_id,
-
-                times_of_last_games,
-                times_of_last_games_against_opp_away,
-                times_of_last_games_against_opp_home,
-
-                dk_fantasy_points,
-                dk_fantasy_points_last_games,
-                dk_fantasy_points_last_games_against_opp_away,
-                dk_fantasy_points_last_games_against_opp_home,
-
-                seconds_played_last_games,
-                seconds_played_last_games_against_opp_away,
-                seconds_played_last_games_against_opp_home,
-
-                plus_minus_last_games,
-                plus_minus_last_games_against_opp_away,
-                plus_minus_last_games_against_opp_home,
-
-                dk_fantasy_points_per_minute,
-                dk_fantasy_points_per_minute_last_games,
-                dk_fantasy_points_per_minute_last_games_against_opp_away,
-                dk_fantasy_points_per_minute_last_games_against_opp_home,
-
-                opp_dk_fantasy_points_allowed_vs_position_last_game_only,
-                opp_dk_fantasy_points_allowed_vs_position_last_games,
-                opp_dk_fantasy_points_allowed_vs_position_last_games_away,
-                opp_dk_fantasy_points_allowed_vs_position_last_games_home
-            )
-            values (
-                '{games_player['game_basketball_reference_id']}',
-                '{games_player['player_basketball_reference_id']}',
-
-                '{json.dumps(stats_last_games['times_of_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['times_of_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['times_of_games'])}',
-
-                {json.dumps(calculate_fantasy_score(games_player))},
-                '{json.dumps(stats_last_games['dk_fantasy_points_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['dk_fantasy_points_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['dk_fantasy_points_last_games'])}',
-
-                '{json.dumps(stats_last_games['seconds_played_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['seconds_played_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['seconds_played_last_games'])}',
-
-                '{json.dumps(stats_last_games['plus_minus_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['plus_minus_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['plus_minus_last_games'])}',
-
-                {json.dumps(calculate_fppm(games_player))},
-                '{json.dumps(stats_last_games['dk_fantasy_points_per_minute_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['dk_fantasy_points_per_minute_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['dk_fantasy_points_per_minute_last_games'])}',
-
-                {json.dumps(opp_dk_fantasy_points_allowed_vs_position_last_game_only)},
-                '{json.dumps(stats_last_games['opp_dk_fantasy_points_allowed_vs_position_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_away['opp_dk_fantasy_points_allowed_vs_position_last_games'])}',
-                '{json.dumps(stats_last_games_against_opp_home['opp_dk_fantasy_points_allowed_vs_position_last_games'])}'
-            )
-        '''
-    )
+        'times_of_last_games': times_to_window(stats_last_games['times_of_games']),
+        'times_of_last_games_against_opp_away': times_to_window(stats_last_games_against_opp_away['times_of_games']),
+        'times_of_last_games_against_opp_home': times_to_window(stats_last_games_against_opp_home['times_of_games']),
 
-    services.sql.commit()
+        'dk_fantasy_points': calculate_fantasy_score(games_player),
+        'dk_fantasy_points_per_minute': calculate_fppm(games_player),
+        'opp_dk_fantasy_points_allowed_vs_position_last_game_only': opp_dk_fantasy_points_allowed_vs_position_last_game_only
+    }
+    for stat in [
+        'dk_fantasy_points_last_games',
+        'seconds_played_last_games',
+        'plus_minus_last_games',
+        'dk_fantasy_points_per_minute_last_games'
+    ]:
+        gpc[stat] = last_games_to_blob(stats_last_games[stat])
+        gpc[f'{stat}_against_opp_away'] = last_games_to_blob(stats_last_games_against_opp_away[stat])
+        gpc[f'{stat}_against_opp_home'] = last_games_to_blob(stats_last_games_against_opp_home[stat])
+    gpc['opp_dk_fantasy_points_allowed_vs_position_last_games'] = last_games_to_blob(
+        stats_last_games['opp_dk_fantasy_points_allowed_vs_position_last_games'])
+    gpc['opp_dk_fantasy_points_allowed_vs_position_last_games_away'] = last_games_to_blob(
+        stats_last_games_against_opp_away['opp_dk_fantasy_points_allowed_vs_position_last_games'])
+    gpc['opp_dk_fantasy_points_allowed_vs_position_last_games_home'] = last_games_to_blob(
+        stats_last_games_against_opp_home['opp_dk_fantasy_points_allowed_vs_position_last_games'])
+
+    (writer or games_players_computed_writer()).write(gpc)
 
     # if os.environ.get('DEBUG') == '1':
     #     pprint.pprint(gpc)
 
 
-def get_valid_season_players():
-    player_season_averages = services.sql.execute(
-        '''
-            select gp.player_basketball_reference_id, tp.season, avg(gp.seconds_played) as avg_seconds_played, count(gp.player_basketball_reference_id) as games_played
-            from games_players as gp
-            inner join games as g
-            	on g.basketball_reference_id = gp.game_basketball_reference_id
-            inner join teams_players as tp
-            	on tp.player_basketball_reference_id = gp.player_basketball_reference_id
-            	and (
-            		tp.team_basketball_reference_id = g.home_team_basketball_reference_id
-            		or tp.team_basketball_reference_id = g.away_team_basketball_reference_id
-            	)
-            	and tp.season = g.season
-            group by gp.player_basketball_reference_id, tp.season
+# The players with enough games and minutes in a season to train and predict
+# on, as a condition on player_season_stats as pss
+VALID_PLAYER_SEASON_SQL = f'''
+    pss.games_played >= {MIN_GAMES_PLAYED_PER_SEASON}
+    and pss.avg_seconds_played >= {MIN_SECONDS_PLAYED_IN_GAME}
+'''
+
+
+def update_player_season_stats(season=None, player_basketball_reference_ids=None, connection=None):
+    """
+    Recomputes player_season_stats from the box scores, for some players in a
+    season or for everything. Their rows are replaced, so players who no
+    longer have box scores for a season lose theirs
+    """
+    connection = connection or services.sql
+
+    season_sql = ''
+    stats_season_sql = ''
+    if season is not None:
+        season_sql = f'and g.season = {season}'
+        stats_season_sql = f'and season = {season}'
+
+    players_sql = ''
+    stats_players_sql = ''
+    if player_basketball_reference_ids is not None:
+        players = ', '.join([f"'{p}'" for p in player_basketball_reference_ids])
+        players_sql = f'and gp.player_basketball_reference_id in ({players})'
+        stats_players_sql = f'and player_basketball_reference_id in ({players})'
+
+    with connection:
+        connection.execute(
+            f'''
+                delete from player_season_stats
+                where true
+                {stats_season_sql}
+                {stats_players_sql}
+            '''
+        )
+        connection.execute(
+            f'''
+                insert into player_season_stats (
+                    player_basketball_reference_id,
+                    season,
+                    games_played,
+                    avg_seconds_played
+                )
+                select
+                    gp.player_basketball_reference_id,
+                    tp.season,
+                    count(gp.player_basketball_reference_id) as games_played,
+                    avg(gp.seconds_played) as avg_seconds_played
+                from games_players as gp
+                inner join games as g
+                	on g.basketball_reference_id = gp.game_basketball_reference_id
+                inner join teams_players as tp
+                	on tp.player_basketball_reference_id = gp.player_basketball_reference_id
+                	and (
+                		tp.team_basketball_reference_id = g.home_team_basketball_reference_id
+                		or tp.team_basketball_reference_id = g.away_team_basketball_reference_id
+                	)
+                	and tp.season = g.season
+                where true
+                {season_sql}
+                {players_sql}
+                group by gp.player_basketball_reference_id, tp.season
+            '''
+        )
+
+
+def get_valid_players(season, connection=None):
+    connection = connection or services.sql
+    rows = connection.execute(
+        f'''
+            select pss.player_basketball_reference_id
+            from player_season_stats as pss
+            where pss.season = {season}
+            and {VALID_PLAYER_SEASON_SQL}
         '''
     ).fetchall()
+    return set([r['player_basketball_reference_id'] for r in rows])
 
-    valid_season_players = {}
-    for player_season in player_season_averages:
-        if player_season['avg_seconds_played'] < MIN_SECONDS_PLAYED_IN_GAME:
-            continue
-        if player_season['games_played'] < MIN_GAMES_PLAYED_PER_SEASON:
-            continue
 
-        valid_season_players[f"{player_season['season']}_{player_season['player_basketball_reference_id']}"] = player_season
+# games_players_computed keeps the newest LAST_GAMES_WINDOW non-null values of
+# each last games list, plus aggregates over the whole list, rather than the
+# whole season so far
+LAST_GAMES_WINDOW = 5
 
-    return valid_season_players
 
+class LastGamesWindow:
+    """
+    A last games list built oldest to newest: its newest non-null values,
+    newest first, the newest raw value and aggregates over all of it
+    """
 
-def cache_data_for_season(season):
-    print(f'Caching games_players for season {season}')
+    def __init__(self):
+        self.length = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.last = None
+        self.window = collections.deque(maxlen=LAST_GAMES_WINDOW)
+
+    def push(self, value):
+        self.length += 1
+        self.last = value
+        if value is None:
+            return
+
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.window.appendleft(value)
+
+    def to_blob(self):
+        """
+        None for an empty list, otherwise little-endian uint32 length and
+        count, then float64 sum, sum of squares, min and max only if the
+        window doesn't hold every non-null value, then the window
+        """
+        if self.length == 0:
+            return None
+
+        header = np.array([self.length, self.count], dtype='<u4').tobytes()
+        aggregates = []
+        if self.count > LAST_GAMES_WINDOW:
+            aggregates = [self.sum, self.sum_squares, self.min, self.max]
+        return header + np.array(aggregates + list(self.window), dtype='<f8').tobytes()
+
+
+def last_games_to_blob(last_games):
+    """Packs a newest-first last games list, or its JSON, for games_players_computed"""
+    window = LastGamesWindow()
+    for value in reversed(parse_json_field(last_games) or []):
+        window.push(value)
+    return window.to_blob()
+
+
+def times_to_window(times_of_games):
+    """The newest times of a newest-first list, as games_players_computed keeps them"""
+    return json.dumps(list(parse_json_field(times_of_games) or [])[0:LAST_GAMES_WINDOW])
+
+
+GAMES_PLAYERS_COMPUTED_COLUMNS = [
+    'game_basketball_reference_id',
+    'player_basketball_reference_id',
+
+    'times_of_last_games',
+    'times_of_last_games_against_opp_away',
+    'times_of_last_games_against_opp_home',
+
+    'dk_fantasy_points',
+    'dk_fantasy_points_last_games',
+    'dk_fantasy_points_last_games_against_opp_away',
+    'dk_fantasy_points_last_games_against_opp_home',
+
+    'seconds_played_last_games',
+    'seconds_played_last_games_against_opp_away',
+    'seconds_played_last_games_against_opp_home',
+
+    'plus_minus_last_games',
+    'plus_minus_last_games_against_opp_away',
+    'plus_minus_last_games_against_opp_home',
+
+    'dk_fantasy_points_per_minute',
+    'dk_fantasy_points_per_minute_last_games',
+    'dk_fantasy_points_per_minute_last_games_against_opp_away',
+    'dk_fantasy_points_per_minute_last_games_against_opp_home',
+
+    'opp_dk_fantasy_points_allowed_vs_position_last_game_only',
+    'opp_dk_fantasy_points_allowed_vs_position_last_games',
+    'opp_dk_fantasy_points_allowed_vs_position_last_games_away',
+    'opp_dk_fantasy_points_allowed_vs_position_last_games_home'
+]
+
+GAMES_PLAYERS_COMPUTED_BATCH_SIZE = int(os.environ.get('GAMES_PLAYERS_COMPUTED_BATCH_SIZE', 5000))
+
+
+class GamesPlayersComputedWriter:
+    """
+    Buffers games_players_computed rows and upserts them a batch at a time,
+    each batch in one transaction on a WAL journal, so caching pays for a sync
+    per batch rather than per row. Whatever is buffered is written on close,
+    leaving a with block, or at interpreter exit. Pool workers skip atexit,
+    so they need to close
+    """
+
+    def __init__(self, connection=None, batch_size=GAMES_PLAYERS_COMPUTED_BATCH_SIZE):
+        self.connection = connection or services.sql
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+
+        self.connection.commit()
+        self.connection.execute('pragma journal_mode=WAL')
+        # WAL stays consistent without syncing on every commit
+        self.connection.execute('pragma synchronous=NORMAL')
+        atexit.register(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, gpc):
+        self.rows.append([gpc[c] for c in GAMES_PLAYERS_COMPUTED_COLUMNS])
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+
+        updates = ', '.join([f'{c} = excluded.{c}' for c in GAMES_PLAYERS_COMPUTED_COLUMNS[2:]])
+        with self.connection:
+            self.connection.executemany(
+                f'''
+                    insert into games_players_computed ({', '.join(GAMES_PLAYERS_COMPUTED_COLUMNS)})
+                    values ({', '.join(['?'] * len(GAMES_PLAYERS_COMPUTED_COLUMNS))})
+                    on conflict (game_basketball_reference_id, player_basketball_reference_id)
+                    do update set {updates}, updated_at = current_timestamp
+                ''',
+                self.rows
+            )
+        self.written += len(self.rows)
+        self.rows = []
 
-    # Only compute new games_players in real mode
-    gp_debug_sql = '''
-        and not exists (
-        	select id
-        	from games_players_computed as gpc
-        	where gpc.game_basketball_reference_id = gp.game_basketball_reference_id
-        	and gpc.player_basketball_reference_id = gp.player_basketball_reference_id
-        )
-        order by datetime(g.time_of_game) asc
-    '''
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
 
-    # Only get a recent James Harden game in debug mode
-    if os.environ.get('DEBUG') == '1':
-        gp_debug_sql = '''
-          and gp.player_basketball_reference_id = 'hardeja01'
-          order by datetime(g.time_of_game) asc
-          limit 1
-        '''
 
-    games_players = services.sql.execute(
+_games_players_computed_writer = None
+
+
+def games_players_computed_writer():
+    """The process' shared writer, for callers that cache one row at a time"""
+    global _games_players_computed_writer
+    if _games_players_computed_writer is None:
+        _games_players_computed_writer = GamesPlayersComputedWriter()
+    return _games_players_computed_writer
+
+
+def _load_season(season, connection=None):
+    connection = connection or services.sql
+
+    games = connection.execute(
         f'''
           select
-            gp.game_basketball_reference_id,
-            gp.player_basketball_reference_id,
-            gp.seconds_played,
-            gp.points,
-            gp.three_point_field_goals,
-            gp.total_rebounds,
-            gp.assists,
-            gp.steals,
-            gp.blocks,
-            gp.turnovers,
-            gp.free_throws,
-            gp.field_goals_attempted,
-            gp.free_throws_attempted,
-
-            g.season,
-            g.time_of_game,
-            tp.team_basketball_reference_id as player_team_basketball_reference_id,
-            tp.position as position,
-            (case when g.home_team_basketball_reference_id = tp.team_basketball_reference_id then g.away_team_basketball_reference_id else g.home_team_basketball_reference_id end) as opp_team_basketball_reference_id
+            g.basketball_reference_id,
+            g.home_team_basketball_reference_id,
+            g.away_team_basketball_reference_id,
+            g.time_of_game
+          from games as g
+          where g.season = {season}
+          and g.time_of_game is not null
+          order by g.time_of_game asc, g.basketball_reference_id asc
+        '''
+    ).fetchall()
+
+    games_players = connection.execute(
+        f'''
+          select gp.*
           from games_players as gp
           inner join games as g
             on g.basketball_reference_id = gp.game_basketball_reference_id
-          inner join teams_players as tp
-            on tp.player_basketball_reference_id = gp.player_basketball_reference_id
-            and tp.season = g.season
           where g.season = {season}
-          {gp_debug_sql}
         '''
     ).fetchall()
 
-    print(f"Total games_players: {len(games_players)}")
+    teams_players = connection.execute(
+        f'''
+          select
+            tp.player_basketball_reference_id,
+            tp.team_basketball_reference_id,
+            tp.position
+          from teams_players as tp
+          where tp.season = {season}
+          order by tp.id asc
+        '''
+    ).fetchall()
+
+    return games, games_players, teams_players
 
-    valid_season_players = get_valid_season_players()
-    games_players = list(filter(
-        lambda gp: valid_season_players.get(f"{gp['season']}_{gp['player_basketball_reference_id']}", False),
-        games_players
-    ))
-    # Add averages to games_players
-    games_players = list(map(
-        lambda gp: {**gp, **valid_season_players.get(f"{gp['season']}_{gp['player_basketball_reference_id']}", {})},
-        games_players
-    ))
 
-    print(f"Valid games_players: {len(games_players)}")
+def _nan_to_none(value):
+    return None if np.isnan(value) else float(value)
 
-    widgets = [
-        ' [', progressbar.Timer(), '] ',
-        progressbar.Bar(),
-        ' (', progressbar.ETA(), ') '
-    ]
-    for i in progressbar.progressbar(range(len(games_players)), widgets=widgets):
-        cache_single_games_player(
-            games_players[i],
-            games_players[i]['player_team_basketball_reference_id'],
-            games_players[i]['opp_team_basketball_reference_id'],
-            games_players[i]['season'],
-            games_players[i]['time_of_game'],
-            games_players[i]['position']
+
+def _history_entry(games_player, scores, time_of_game):
+    """A row of get_stats_last_games_from_pg, for a game the player's team played"""
+    if games_player is None or not (games_player['seconds_played'] or 0) > MIN_SECONDS_PLAYED_IN_GAME:
+        return {
+            'seconds_played': None,
+            'plus_minus': None,
+            'dk_fantasy_points': None,
+            'dk_fantasy_points_per_minute': None,
+            'time_of_game': time_of_game
+        }
+
+    return {
+        'seconds_played': games_player['seconds_played'],
+        'plus_minus': games_player['plus_minus'],
+        'dk_fantasy_points': scores[0],
+        'dk_fantasy_points_per_minute': scores[1],
+        'time_of_game': time_of_game
+    }
+
+
+class _PlayerHistory:
+    """A player's last games so far, in the shape of get_stats_last_games_from_pg"""
+
+    def __init__(self):
+        self.times_of_games = collections.deque(maxlen=LAST_GAMES_WINDOW)
+        self.dk_fantasy_points = LastGamesWindow()
+        self.seconds_played = LastGamesWindow()
+        self.plus_minus = LastGamesWindow()
+        self.dk_fantasy_points_per_minute = LastGamesWindow()
+
+    def push(self, entry):
+        self.times_of_games.appendleft(entry['time_of_game'])
+        self.dk_fantasy_points.push(entry['dk_fantasy_points'])
+        self.seconds_played.push(entry['seconds_played'])
+        self.plus_minus.push(entry['plus_minus'])
+        self.dk_fantasy_points_per_minute.push(entry['dk_fantasy_points_per_minute'])
+
+
+_EMPTY_PLAYER_HISTORY = _PlayerHistory()
+_EMPTY_LAST_GAMES = LastGamesWindow()
+
+
+def _last_games(history):
+    """A player's history packed for games_players_computed"""
+    return {
+        'times_of_games': json.dumps(list(history.times_of_games)),
+        'dk_fantasy_points_last_games': history.dk_fantasy_points.to_blob(),
+        'seconds_played_last_games': history.seconds_played.to_blob(),
+        'plus_minus_last_games': history.plus_minus.to_blob(),
+        'dk_fantasy_points_per_minute_last_games': history.dk_fantasy_points_per_minute.to_blob()
+    }
+
+
+def compute_games_players_for_season(season, player_basketball_reference_id=None, connection=None):
+    """
+    Computes every games_players_computed row for a season in one sweep.
+
+    Loads the season's games, games_players and teams_players once, then walks
+    the games in time order keeping each player's history and each team's
+    fantasy points allowed vs position. Rows for a game only see games played
+    strictly before it, same as get_stats_last_games_from_pg.
+    """
+    games, games_players, teams_players = _load_season(season, connection=connection)
+
+    # Score the whole season in one call
+    season_scores = calculate_fantasy_scores_for_rows(games_players)
+    season_fppms = calculate_fppms(
+        season_scores, [gp['seconds_played'] for gp in games_players])
+
+    games_players_by_key = {}
+    games_players_by_game = {}
+    scores_by_key = {}
+    for i, gp in enumerate(games_players):
+        key = (gp['game_basketball_reference_id'], gp['player_basketball_reference_id'])
+        games_players_by_key[key] = gp
+        games_players_by_game.setdefault(gp['game_basketball_reference_id'], []).append(gp)
+        scores_by_key[key] = (
+            _nan_to_none(season_scores[i]),
+            _nan_to_none(season_fppms[i])
         )
-    
-    services.sql.commit()
+
+    players_teams = {}
+    rosters = {}
+    for tp in teams_players:
+        player = tp['player_basketball_reference_id']
+        players_teams.setdefault(player, []).append(
+            (tp['team_basketball_reference_id'], tp['position']))
+        rosters.setdefault(tp['team_basketball_reference_id'], []).append(player)
+
+    valid_players = get_valid_players(season, connection=connection)
+
+    player_history = collections.defaultdict(_PlayerHistory)
+    player_history_matchup = collections.defaultdict(_PlayerHistory)
+    allowed = collections.defaultdict(LastGamesWindow)
+    allowed_matchup = collections.defaultdict(LastGamesWindow)
+
+    computed = []
+
+    i = 0
+    while i < len(games):
+        # Games at the same time don't see each other
+        j = i
+        while j < len(games) and games[j]['time_of_game'] == games[i]['time_of_game']:
+            j += 1
+        games_at_time = games[i:j]
+        i = j
+
+        dk_fantasy_points_by_game = {}
+
+        for g in games_at_time:
+            game_id = g['basketball_reference_id']
+            home = g['home_team_basketball_reference_id']
+            away = g['away_team_basketball_reference_id']
+            dk_fantasy_points_by_game[game_id] = []
+
+            for gp in games_players_by_game.get(game_id, []):
+                player = gp['player_basketball_reference_id']
+                if player not in players_teams:
+                    continue
+                if player not in valid_players:
+                    continue
+
+                # Prefer the team the player actually played for in this game
+                player_teams = players_teams[player]
+                player_team, position = next(
+                    (pt for pt in player_teams if pt[0] in (home, away)), player_teams[-1])
+                opp_team = away if player_team == home else home
+
+                scores = scores_by_key[(game_id, player)]
+                dk_fantasy_points_by_game[game_id].append((player, scores[0]))
+
+                if player_basketball_reference_id is not None and player != player_basketball_reference_id:
+                    continue
+
+                stats_last_games = _last_games(
+                    player_history.get(player, _EMPTY_PLAYER_HISTORY))
+                stats_last_games_against_opp_away = _last_games(
+                    player_history_matchup.get((player, player_team, opp_team), _EMPTY_PLAYER_HISTORY))
+                stats_last_games_against_opp_home = _last_games(
+                    player_history_matchup.get((player, opp_team, player_team), _EMPTY_PLAYER_HISTORY))
+
+                opp_allowed = allowed.get((opp_team, position), _EMPTY_LAST_GAMES)
+                opp_allowed_away = allowed_matchup.get(
+                    (opp_team, position, player_team, opp_team), _EMPTY_LAST_GAMES)
+                opp_allowed_home = allowed_matchup.get(
+                    (opp_team, position, opp_team, player_team), _EMPTY_LAST_GAMES)
+
+                computed.append({
+                    'game_basketball_reference_id': game_id,
+                    'player_basketball_reference_id': player,
+
+                    'times_of_last_games': stats_last_games['times_of_games'],
+                    'times_of_last_games_against_opp_away': stats_last_games_against_opp_away['times_of_games'],
+                    'times_of_last_games_against_opp_home': stats_last_games_against_opp_home['times_of_games'],
+
+                    'dk_fantasy_points': scores[0],
+                    'dk_fantasy_points_last_games': stats_last_games['dk_fantasy_points_last_games'],
+                    'dk_fantasy_points_last_games_against_opp_away': stats_last_games_against_opp_away['dk_fantasy_points_last_games'],
+                    'dk_fantasy_points_last_games_against_opp_home': stats_last_games_against_opp_home['dk_fantasy_points_last_games'],
+
+                    'seconds_played_last_games': stats_last_games['seconds_played_last_games'],
+                    'seconds_played_last_games_against_opp_away': stats_last_games_against_opp_away['seconds_played_last_games'],
+                    'seconds_played_last_games_against_opp_home': stats_last_games_against_opp_home['seconds_played_last_games'],
+
+                    'plus_minus_last_games': stats_last_games['plus_minus_last_games'],
+                    'plus_minus_last_games_against_opp_away': stats_last_games_against_opp_away['plus_minus_last_games'],
+                    'plus_minus_last_games_against_opp_home': stats_last_games_against_opp_home['plus_minus_last_games'],
+
+                    'dk_fantasy_points_per_minute': scores[1],
+                    'dk_fantasy_points_per_minute_last_games': stats_last_games['dk_fantasy_points_per_minute_last_games'],
+                    'dk_fantasy_points_per_minute_last_games_against_opp_away': stats_last_games_against_opp_away['dk_fantasy_points_per_minute_last_games'],
+                    'dk_fantasy_points_per_minute_last_games_against_opp_home': stats_last_games_against_opp_home['dk_fantasy_points_per_minute_last_games'],
+
+                    'opp_dk_fantasy_points_allowed_vs_position_last_game_only': opp_allowed.last,
+                    'opp_dk_fantasy_points_allowed_vs_position_last_games': opp_allowed.to_blob(),
+                    'opp_dk_fantasy_points_allowed_vs_position_last_games_away': opp_allowed_away.to_blob(),
+                    'opp_dk_fantasy_points_allowed_vs_position_last_games_home': opp_allowed_home.to_blob()
+                })
+
+        # Now that every row at this time is computed, roll the games into
+        # the state seen by later games. Read newest first, games at the same
+        # time come out in descending id order, like get_stats_last_games_from_pg
+        for g in games_at_time:
+            game_id = g['basketball_reference_id']
+            home = g['home_team_basketball_reference_id']
+            away = g['away_team_basketball_reference_id']
+
+            # A player traded between the two teams sees the game once per
+            # team, like the teams_players join does
+            for team in (home, away):
+                for player in rosters.get(team, []):
+                    entry = _history_entry(
+                        games_players_by_key.get((game_id, player)),
+                        scores_by_key.get((game_id, player)),
+                        g['time_of_game'])
+                    player_history[player].push(entry)
+                    player_history_matchup[(player, away, home)].push(entry)
+
+            for team in (home, away):
+                allowed_by_position = {}
+                for player, dk_fantasy_points in dk_fantasy_points_by_game[game_id]:
+                    for player_team, position in players_teams[player]:
+                        if player_team == team or position is None:
+                            continue
+                        total = allowed_by_position.get(position)
+                        if dk_fantasy_points is not None:
+                            # dk_fantasy_points is a real column, so sql sums are floats
+                            total = (total or 0.0) + float(dk_fantasy_points)
+                        allowed_by_position[position] = total
+                for position, total in allowed_by_position.items():
+                    allowed[(team, position)].push(total)
+                    allowed_matchup[(team, position, away, home)].push(total)
+
+    return computed
+
+
+def _season_games_players_computed(season, connection=None):
+    # Only get a recent James Harden game in debug mode
+    player_basketball_reference_id = None
+    if os.environ.get('DEBUG') == '1':
+        player_basketball_reference_id = 'hardeja01'
+
+    games_players_computed = compute_games_players_for_season(
+        season, player_basketball_reference_id=player_basketball_reference_id, connection=connection)
+    if player_basketball_reference_id is not None:
+        games_players_computed = games_players_computed[0:1]
+
+    print(f"Valid games_players for season {season}: {len(games_players_computed)}")
+    return games_players_computed
+
+
+def cache_data_for_season(season):
+    print(f'Caching games_players for season {season}')
+
+    with GamesPlayersComputedWriter() as writer:
+        for gpc in _season_games_players_computed(season):
+            writer.write(gpc)
+    print(f'Upserted games_players: {writer.written}')
+
+
+# cache_data computes seasons in a pool of workers that each read through their
+# own read-only connection, and hands the rows over a queue to a single writer
+# process, so the workers never contend for SQLite's write lock
+CACHE_DATA_PROCESSES = int(os.environ.get(
+    'CACHE_DATA_PROCESSES', max(1, multiprocessing.cpu_count() - 1)))
+# Batches in flight before workers wait on the writer
+CACHE_DATA_QUEUE_SIZE = 16
+
+_worker_connection = None
+_worker_queue = None
+
+
+def _init_cache_data_worker(rows_queue):
+    global _worker_connection, _worker_queue
+    _worker_connection = services.connect(read_only=True)
+    _worker_queue = rows_queue
+
+
+def _cache_data_worker(season):
+    games_players_computed = _season_games_players_computed(season, connection=_worker_connection)
+    for rows in chunks(games_players_computed, GAMES_PLAYERS_COMPUTED_BATCH_SIZE):
+        _worker_queue.put(rows)
+    return len(games_players_computed)
+
+
+def _cache_data_writer(rows_queue):
+    with GamesPlayersComputedWriter(services.connect()) as writer:
+        for rows in iter(rows_queue.get, None):
+            for gpc in rows:
+                writer.write(gpc)
+    print(f'Upserted games_players: {writer.written}')
 
 
 def cache_data():
@@ -475,27 +956,58 @@ def cache_data():
         'select distinct season from games order by season asc'
     ).fetchall()
     seasons = list(map(lambda r: r['season'], seasons))
+    # Box scores written from here on are left for the next refresh
+    dirty_max_id = games_players_dirty_max_id()
 
-    p = multiprocessing.Pool(int(multiprocessing.cpu_count() / 2) - 1)
-    p.map(cache_data_for_season, seasons)
-
+    rows_queue = multiprocessing.Queue(CACHE_DATA_QUEUE_SIZE)
+    writer = multiprocessing.Process(target=_cache_data_writer, args=(rows_queue,))
+    writer.start()
 
-# Load Data ##
+    p = multiprocessing.Pool(
+        min(CACHE_DATA_PROCESSES, len(seasons)) or 1,
+        initializer=_init_cache_data_worker,
+        initargs=(rows_queue,)
+    )
+    try:
+        result = p.map_async(_cache_data_worker, seasons)
+        # Workers wait on a full queue forever if the writer dies, so watch it
+        # while they run, and give up on them if it does
+        while not result.ready() and writer.is_alive():
+            result.wait(1)
+        if not result.ready():
+            p.terminate()
+    finally:
+        # Otherwise close rather than terminate, so workers flush what they've
+        # queued
+        p.close()
+        p.join()
+        if writer.is_alive():
+            rows_queue.put(None)
+        writer.join()
+
+    assert writer.exitcode == 0, f'games_players_computed writer exited with {writer.exitcode}'
+    computed = sum(result.get())
+    print(f'Cached games_players: {computed}')
+
+    clear_games_players_dirty(dirty_max_id)
 
-def add_age(gp):
-    time_of_game = datetime.datetime.strptime(gp['time_of_game'], "%Y-%m-%d %H:%M:%S")
-    date_of_birth = datetime.datetime.strptime(gp['date_of_birth'], "%Y-%m-%d")
-    age = int((time_of_game - date_of_birth).days / 365)
-    return {**gp, 'age_at_time_of_game': age}
 
+# Load Data ##
 
-def get_data(
+def query_data(
     limit=None,
     offset=None,
     player_basketball_reference_id=None,
     game_basketball_reference_id=None,
-    season=None
+    season=None,
+    connection=None
 ):
+    """
+    A cursor over the valid games_players, with their computed last games and
+    age
+    """
+    connection = connection or services.sql
+
     limit_sql = ''
     if limit is not None:
         limit_sql = f'limit {limit}'
@@ -516,7 +1028,7 @@ def get_data(
     if season is not None:
         season_sql = f"and g.season = {season}"
 
-    games_players = services.sql.execute(
+    cursor = connection.execute(
         f"""
              	select
                   gp.game_basketball_reference_id,
@@ -526,6 +1038,7 @@ def get_data(
                   g.time_of_game as time_of_game,
 
                   p.date_of_birth,
+                  cast(julianday(g.time_of_game) - julianday(p.date_of_birth) as integer) / 365 as age_at_time_of_game,
                   tp.height_inches,
                   tp.weight_lbs,
                   tp.experience,
@@ -564,6 +1077,8 @@ def get_data(
                   
                   gp.player_basketball_reference_id,
 
+                  pss.games_played,
+                  pss.avg_seconds_played,
 
                   gpc.dk_fantasy_points
                 from games_players as gp
@@ -580,6 +1095,10 @@ def get_data(
                   and tp.season = g.season
                 inner join teams as t
                   on t.basketball_reference_id = tp.team_basketball_reference_id
+                inner join player_season_stats as pss
+                  on pss.player_basketball_reference_id = gp.player_basketball_reference_id
+                  and pss.season = g.season
+                  and {VALID_PLAYER_SEASON_SQL}
                 left join games_players_computed as gpc
                   on gpc.game_basketball_reference_id = gp.game_basketball_reference_id
                   and gpc.player_basketball_reference_id = gp.player_basketball_reference_id
@@ -591,32 +1110,73 @@ def get_data(
                 {limit_sql}
                 {offset_sql}
         """
-    ).fetchall()
+    )
 
-    print(f"Total games_players: {len(games_players)}")
+    return cursor
 
-    valid_season_players = get_valid_season_players()
-    games_players = list(filter(
-        lambda gp: valid_season_players.get(f"{gp['season']}_{gp['player_basketball_reference_id']}", False),
-        games_players
-    ))
-    # Add averages to games_players
-    games_players = list(map(
-        lambda gp: {**gp, **valid_season_players.get(f"{gp['season']}_{gp['player_basketball_reference_id']}", {})},
-        games_players
-    ))
 
-    print(f"Valid games_players: {len(games_players)}")
+GET_DATA_CHUNK_SIZE = 10000
 
-    print('Calculating ages')
 
-    try:
-        p = multiprocessing.Pool(int(multiprocessing.cpu_count() / 2) - 1)
-        games_players = p.map(add_age, games_players)
-    except AssertionError:
-        games_players = list(map(add_age, games_players))
+def _column_array(values):
+    """
+    A column as an int64 or float64 array, or an object array when it has
+    anything other than numbers, NULLs included
+    """
+    types = set(map(type, values))
+    if types <= {int}:
+        return np.array(values, dtype=np.int64)
+    if types <= {int, float}:
+        return np.array(values, dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def cursor_to_columns(cursor, chunk_size=GET_DATA_CHUNK_SIZE):
+    """A cursor's rows as a dict of column arrays, built a chunk of rows at a time"""
+    names = [d[0] for d in cursor.description]
+    parts = {name: [] for name in names}
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if len(rows) == 0:
+            break
+        for name, values in zip(names, zip(*rows)):
+            parts[name].append(_column_array(values))
+
+    return {
+        name: np.concatenate(parts[name]) if len(parts[name]) > 0 else _column_array(())
+        for name in names
+    }
+
 
-    print('Done calculating ages')
+def num_rows(columns):
+    return len(next(iter(columns.values()))) if len(columns) > 0 else 0
+
+
+def column_chunks(columns, n):
+    """Yield successive n-row slices of a dict of columns"""
+    for i in range(0, num_rows(columns), n):
+        yield {name: column[i:i + n] for name, column in columns.items()}
+
+
+def get_data(
+    limit=None,
+    offset=None,
+    player_basketball_reference_id=None,
+    game_basketball_reference_id=None,
+    season=None
+):
+    """The valid games_players as a dict of column arrays, see query_data"""
+    games_players = cursor_to_columns(query_data(
+        limit=limit,
+        offset=offset,
+        player_basketball_reference_id=player_basketball_reference_id,
+        game_basketball_reference_id=game_basketball_reference_id,
+        season=season
+    ))
+
+    print(f"Valid games_players: {num_rows(games_players)}")
 
     return games_players
 
@@ -624,66 +1184,323 @@ def get_data(
 ### Cache features ###
 
 
+FEATURES_CHUNK_SIZE = 1000
+# The mappers computed_features was encoded with, saved with every model
+# trained on it
+FEATURES_MAPPERS_FILE = 'tmp/features_mappers.json'
+
+
+@functools.lru_cache()
+def features_mappers():
+    """
+    The mappers computed_features was last encoded with, or fresh ones when
+    there are none saved yet
+    """
+    try:
+        return Mappers.load(FEATURES_MAPPERS_FILE)
+    except (OSError, ValueError):
+        return make_mappers()
+
+
+def save_features_mappers(path):
+    """Copies the mappers computed_features was encoded with to path"""
+    if os.path.exists(FEATURES_MAPPERS_FILE):
+        shutil.copyfile(FEATURES_MAPPERS_FILE, path)
+    else:
+        make_mappers().save(path)
+
+
+_worker_mappers = None
+
+
+def _init_features_worker(mappers):
+    global _worker_mappers
+    _worker_mappers = mappers
+
+
 def cache_features():
     # NOTE Calling to build cache for other processes
     print('Warming cache')
-    make_mappers()
+    mappers = make_mappers()
     print('Done warming cache')
 
     # Get data and compute features
 
+    dirty_max_id = games_players_dirty_max_id()
     games_players = []
     if os.environ.get('DEBUG') == '1':
         games_players = get_data(season=2019)
     else:
         games_players = get_data()
 
-    p = multiprocessing.Pool(int(multiprocessing.cpu_count() / 2))
-    computed_features = p.map(compute_features_single_row, games_players)
+    p = multiprocessing.Pool(
+        max(1, int(multiprocessing.cpu_count() / 2)),
+        initializer=_init_features_worker,
+        initargs=(mappers,)
+    )
 
-    # Insert features
+    # Insert features as the pool finishes each chunk into a temp table, then
+    # swap them in in one transaction, so readers see the old ones until then
 
     services.sql.isolation_level = None
     services.sql.execute('pragma journal_mode=WAL')
 
+    services.sql.execute('drop table if exists temp.computed_features_new')
+    services.sql.execute(
+        f'''
+            create temp table computed_features_new as
+            select {', '.join(COMPUTED_FEATURES_COLUMNS)}
+            from computed_features
+            where false
+        '''
+    )
+
     services.sql.execute('begin')
-    services.sql.execute(f'delete from computed_features')
-    for cf in computed_features:
-        services.sql.execute(
-            f'''
-                insert into computed_features (
-                    game_basketball_reference_id,
-                    player_basketball_reference_id,
-                    season,
-                    x,
-                    y,
-                    sw
-                )
-                values (
-                    '{cf['game_basketball_reference_id']}',
-                    '{cf['player_basketball_reference_id']}',
-                    {cf['season']},
-                    '{cf['x']}',
-                    '{cf['y']}',
-                    '{cf['sw']}'
-                )
-            '''
-        )
+    inserted = 0
+    for computed_features in p.imap(compute_features_rows, column_chunks(games_players, FEATURES_CHUNK_SIZE)):
+        insert_computed_features(services.sql, computed_features, table='temp.computed_features_new')
+        inserted += len(computed_features)
+        print(f'Inserted features: {inserted}/{num_rows(games_players)}')
+    services.sql.execute('end')
+
+    p.close()
+    p.join()
+
+    services.sql.execute('begin')
+    services.sql.execute('delete from computed_features')
+    services.sql.execute(
+        f'''
+            insert into computed_features ({', '.join(COMPUTED_FEATURES_COLUMNS)})
+            select {', '.join(COMPUTED_FEATURES_COLUMNS)}
+            from temp.computed_features_new
+            order by rowid
+        '''
+    )
     services.sql.execute('end')
+    services.sql.execute('drop table temp.computed_features_new')
     services.sql.commit()
 
+    # Only once the features are in, so the two always match
+    os.makedirs(os.path.dirname(FEATURES_MAPPERS_FILE), exist_ok=True)
+    mappers.save(FEATURES_MAPPERS_FILE + '.tmp')
+    os.replace(FEATURES_MAPPERS_FILE + '.tmp', FEATURES_MAPPERS_FILE)
+    features_mappers.cache_clear()
+
+    # A DEBUG run only rebuilds one season
+    if os.environ.get('DEBUG') != '1':
+        clear_games_players_dirty(dirty_max_id)
+
+
+COMPUTED_FEATURES_COLUMNS = [
+    'game_basketball_reference_id',
+    'player_basketball_reference_id',
+    'season',
+    'x',
+    'y',
+    'sw'
+]
+
+
+def insert_computed_features(connection, computed_features, table='computed_features'):
+    connection.executemany(
+        f'''
+            insert into {table} ({', '.join(COMPUTED_FEATURES_COLUMNS)})
+            values ({', '.join(['?'] * len(COMPUTED_FEATURES_COLUMNS))})
+        ''',
+        [tuple(cf[c] for c in COMPUTED_FEATURES_COLUMNS) for cf in computed_features]
+    )
+
+
 def compute_features_single_row(datum):
-    mappers = make_mappers()
+    return compute_features_rows(datums_to_columns([datum]))[0]
 
-    return {
-        'game_basketball_reference_id': datum['game_basketball_reference_id'],
-        'player_basketball_reference_id': datum['player_basketball_reference_id'],
-        'season': datum['season'],
-        'x': mappers.datum_to_x(datum).tolist(),
-        'y': mappers.datum_to_y(datum),
-        'sw': mappers.datum_to_sw(datum)
+
+def compute_features_rows(columns):
+    """compute_features_single_row for a chunk of columns, encoded as one batch"""
+    mappers = _worker_mappers or features_mappers()
+    X = mappers.datums_to_X(columns)
+
+    # Sample weights only depend on the time of the game
+    sw_by_time_of_game = {
+        time_of_game: mappers.datum_to_sw({'time_of_game': time_of_game})
+        for time_of_game in set(columns['time_of_game'])
     }
 
+    return [
+        {
+            'game_basketball_reference_id': game_basketball_reference_id,
+            'player_basketball_reference_id': player_basketball_reference_id,
+            'season': season,
+            'x': x_to_blob(x),
+            'y': mappers.datum_to_y({'dk_fantasy_points': dk_fantasy_points})[0],
+            'sw': sw_by_time_of_game[time_of_game]
+        }
+        for game_basketball_reference_id, player_basketball_reference_id, season, time_of_game, dk_fantasy_points, x in zip(
+            list(columns['game_basketball_reference_id']),
+            list(columns['player_basketball_reference_id']),
+            np.asarray(columns['season']).tolist(),
+            list(columns['time_of_game']),
+            np.asarray(columns['dk_fantasy_points']).tolist(),
+            X
+        )
+    ]
+
+
+def x_to_blob(x):
+    """Packs a feature vector for computed_features.x"""
+    return np.asarray(x, dtype='<f4').tobytes()
+
+
+def x_blobs_to_array(blobs):
+    """Unpacks computed_features.x blobs into a float32 matrix, one row per blob"""
+    return np.frombuffer(b''.join(blobs), dtype='<f4').reshape(len(blobs), -1)
+
+
+### Incremental refresh ###
+
+
+def _existing_games_players_computed(season, connection):
+    rows = connection.execute(
+        f'''
+            select {', '.join(['gpc.' + c for c in GAMES_PLAYERS_COMPUTED_COLUMNS])}
+            from games_players_computed as gpc
+            inner join games as g
+              on g.basketball_reference_id = gpc.game_basketball_reference_id
+            where g.season = {season}
+        '''
+    ).fetchall()
+    return {(r[0], r[1]): tuple(r) for r in rows}
+
+
+def refresh_season(season, players=(), connection=None):
+    """
+    Recomputes a season's games_players_computed in memory, writes only the
+    rows that differ from what's cached, and recomputes computed_features for
+    those and for all of the given players' games, whose roster details,
+    starts or validity may have changed without their last games changing.
+    Returns the changed and the removed (game, player) keys
+    """
+    connection = connection or services.sql
+
+    existing = _existing_games_players_computed(season, connection)
+    computed = {
+        (gpc['game_basketball_reference_id'], gpc['player_basketball_reference_id']):
+            tuple(gpc[c] for c in GAMES_PLAYERS_COMPUTED_COLUMNS)
+        for gpc in compute_games_players_for_season(season, connection=connection)
+    }
+    changed = [key for key, row in computed.items() if existing.get(key) != row]
+    removed = [key for key in existing if key not in computed]
+
+    with GamesPlayersComputedWriter(connection) as writer:
+        for key in changed:
+            writer.write(dict(zip(GAMES_PLAYERS_COMPUTED_COLUMNS, computed[key])))
+    with connection:
+        connection.executemany(
+            '''
+                delete from games_players_computed
+                where game_basketball_reference_id = ?
+                and player_basketball_reference_id = ?
+            ''',
+            removed
+        )
+
+    refresh_features(season, set(changed) | set(removed), players=players, connection=connection)
+
+    return changed, removed
+
+
+def refresh_features(season, keys, players=(), connection=None):
+    """
+    Recomputes computed_features for a season's (game, player) keys and for
+    all of the season's games of some players
+    """
+    connection = connection or services.sql
+    players = set(players)
+    if len(keys) == 0 and len(players) == 0:
+        return
+
+    columns = cursor_to_columns(query_data(season=season, connection=connection))
+    mask = np.array([
+        key in keys or key[1] in players
+        for key in zip(columns['game_basketball_reference_id'], columns['player_basketball_reference_id'])
+    ], dtype=bool)
+    columns = {name: column[mask] for name, column in columns.items()}
+
+    computed_features = []
+    for chunk in column_chunks(columns, FEATURES_CHUNK_SIZE):
+        computed_features += compute_features_rows(chunk)
+
+    # Keys and players that are no longer valid games_players only lose their
+    # features
+    with connection:
+        connection.executemany(
+            '''
+                delete from computed_features
+                where game_basketball_reference_id = ?
+                and player_basketball_reference_id = ?
+            ''',
+            list(keys)
+        )
+        connection.executemany(
+            '''
+                delete from computed_features
+                where season = ?
+                and player_basketball_reference_id = ?
+            ''',
+            [(season, player) for player in sorted(players)]
+        )
+        insert_computed_features(connection, computed_features)
+
+
+def refresh_data():
+    """
+    Brings games_players_computed and computed_features up to date with the box
+    scores and rosters written since the last refresh, as recorded in
+    games_players_dirty, recomputing only the seasons they touch
+    """
+    dirty = services.sql.execute(
+        '''
+            select id, season, player_basketball_reference_id, team_basketball_reference_id
+            from games_players_dirty
+            order by id asc
+        '''
+    ).fetchall()
+    if len(dirty) == 0:
+        print('Nothing to refresh')
+        return
+
+    players_by_season = collections.defaultdict(set)
+    teams_by_season = collections.defaultdict(set)
+    for d in dirty:
+        players_by_season[d['season']].add(d['player_basketball_reference_id'])
+        if d['team_basketball_reference_id'] is not None:
+            teams_by_season[d['season']].add(d['team_basketball_reference_id'])
+
+    for season, players in sorted(players_by_season.items()):
+        print(f'Refreshing season {season}: {len(players)} players on {len(teams_by_season[season])} teams')
+        valid_players = get_valid_players(season)
+        update_player_season_stats(season=season, player_basketball_reference_ids=sorted(players))
+        # Players whose games became valid or invalid, which gain or lose all
+        # their features
+        flipped = valid_players ^ get_valid_players(season)
+        changed, removed = refresh_season(season, players=players | flipped)
+        print(f'Changed games_players: {len(changed)}, removed: {len(removed)}, players: {len(players | flipped)}')
+
+    # Rows written while refreshing are left for the next refresh
+    clear_games_players_dirty(dirty[-1]['id'])
+
+
+def games_players_dirty_max_id(connection=None):
+    """The newest games_players_dirty id, or 0, to clear up to once a rebuild is done"""
+    connection = connection or services.sql
+    return connection.execute('select coalesce(max(id), 0) as id from games_players_dirty').fetchone()['id']
+
+
+def clear_games_players_dirty(max_id, connection=None):
+    connection = connection or services.sql
+    connection.execute(f'delete from games_players_dirty where id <= {max_id}')
+    connection.commit()
+
 
 def get_mapped_data(
     limit=None,
@@ -714,7 +1531,7 @@ def get_mapped_data(
 
     data = services.sql.execute(
         f'''
-            select *
+            select cf.x, cf.y, cf.sw
             from computed_features as cf
             where 1
             {player_sql}
@@ -730,85 +1547,245 @@ def get_mapped_data(
     random.Random(0).shuffle(data)
 
     return {
-        'x': np.stack([json.loads(d['x']) for d in data]),
-        'y': np.stack([json.loads(d['y']) for d in data]),
-        'sw': np.stack([json.loads(d['sw']) for d in data])
+        'x': x_blobs_to_array([d['x'] for d in data]),
+        'y': np.array([d['y'] for d in data], dtype=np.float32).reshape(-1, 1),
+        'sw': np.array([d['sw'] for d in data], dtype=np.float32)
     }
 
 
-def get_stats():
-    print('Getting stats')
+def get_num_features():
+    x = services.sql.execute('select x from computed_features limit 1').fetchone()[0]
+    return len(x) // 4
 
-    games_players = get_data()
 
-    print('..Mapping')
-
-    times_of_games = [gp['time_of_game'] for gp in games_players]
-    age_at_time_of_games = [gp['age_at_time_of_game'] for gp in games_players]
-    experiences = [gp['experience'] for gp in games_players]
-    height_inches = [gp['height_inches'] for gp in games_players]
-    weight_lbs = [gp['weight_lbs'] for gp in games_players]
-    year_of_games = [int(gp['year_of_game']) for gp in games_players]
-    month_of_games = [int(gp['month_of_game']) for gp in games_players]
-    day_of_games = [int(gp['day_of_game']) for gp in games_players]
-    seconds_playeds = [gp['seconds_played'] for gp in games_players]
-    dk_fantasy_points_per_minutes = [gp['dk_fantasy_points_per_minute'] for gp in games_players]
-    opp_dk_fantasy_points_allowed_vs_position_last_games = [gp['opp_dk_fantasy_points_allowed_vs_position_last_game_only'] for gp in games_players if gp['opp_dk_fantasy_points_allowed_vs_position_last_game_only'] is not None]
-    dk_fantasy_points = [gp['dk_fantasy_points'] for gp in games_players if gp['dk_fantasy_points'] is not None]
+def get_feature_ids(
+    limit=None,
+    player_basketball_reference_id=None,
+    season=None
+):
+    """computed_features ids, shuffled the same way as get_mapped_data"""
+    limit_sql = ''
+    if limit is not None:
+        limit_sql = f'limit {limit}'
 
-    assert len(opp_dk_fantasy_points_allowed_vs_position_last_games) > 500000
-    assert len(dk_fantasy_points) > 500000
+    player_sql = ''
+    if player_basketball_reference_id is not None:
+        player_sql = f"and cf.player_basketball_reference_id = '{player_basketball_reference_id}'"
 
-    print('..Done mapping')
-    print('..Calculating')
+    season_sql = ''
+    if season is not None:
+        season_sql = f'and cf.season = {season}'
 
-    stats = {
-        'time_of_first_game': min(times_of_games),
-        'time_of_most_recent_game': max(times_of_games),
+    ids = [r['id'] for r in services.sql.execute(
+        f'''
+            select cf.id
+            from computed_features as cf
+            where 1
+            {player_sql}
+            {season_sql}
+            {limit_sql}
+        '''
+    ).fetchall()]
+
+    assert len(ids) != 0
+
+    random.Random(0).shuffle(ids)
+
+    return np.array(ids)
+
+
+class FeatureBatches:
+    """
+    (x, y, sw) float32 batches of computed_features rows, read by id on a
+    background thread so the table never has to fit in memory. Iterating
+    with repeat=True goes on forever, reshuffling every epoch, which is what
+    keras' fit_generator expects.
+    """
+
+    def __init__(self, ids, batch_size, shuffle=True, repeat=True, prefetch=8):
+        self.ids = np.array(ids)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.repeat = repeat
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return int(np.ceil(len(self.ids) / self.batch_size))
+
+    def _load_batch(self, connection, batch_ids):
+        rows = connection.execute(
+            f'''
+                select cf.id, cf.x, cf.y, cf.sw
+                from computed_features as cf
+                where cf.id in ({', '.join(str(int(i)) for i in batch_ids)})
+            '''
+        ).fetchall()
+        rows_by_id = {r['id']: r for r in rows}
+        rows = [rows_by_id[i] for i in batch_ids]
+
+        return (
+            x_blobs_to_array([r['x'] for r in rows]),
+            np.array([r['y'] for r in rows], dtype=np.float32).reshape(-1, 1),
+            np.array([r['sw'] for r in rows], dtype=np.float32)
+        )
+
+    def _fill(self, batches):
+        try:
+            # sqlite connections can't be shared across threads
+            connection = services.connect()
+            rng = np.random.RandomState(0)
+            while True:
+                ids = self.ids
+                if self.shuffle:
+                    ids = rng.permutation(ids)
+                for i in range(0, len(ids), self.batch_size):
+                    batches.put(self._load_batch(connection, ids[i:i + self.batch_size].tolist()))
+                if not self.repeat:
+                    break
+            batches.put(None)
+        except Exception as e:
+            batches.put(e)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.prefetch)
+        threading.Thread(target=self._fill, args=(batches,), daemon=True).start()
+
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+
+
+FEATURE_MATRIX_DIR = 'tmp/feature_matrix'
+FEATURE_MATRIX_CHUNK_SIZE = 10000
+
+
+def cache_feature_matrix(directory=FEATURE_MATRIX_DIR):
+    """
+    Writes computed_features to x.npy, y.npy and sw.npy in directory, already
+    shuffled, streaming rows so the whole table is never in memory
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    n = services.sql.execute('select count(*) from computed_features').fetchone()[0]
+    assert n != 0
+
+    num_features = get_num_features()
+
+    # Row i of the table goes to positions[i], so splits are just ranges
+    positions = list(range(n))
+    random.Random(0).shuffle(positions)
+    positions = np.array(positions)
+
+    x = np.lib.format.open_memmap(
+        directory + '/x.npy', mode='w+', dtype=np.float32, shape=(n, num_features))
+    y = np.lib.format.open_memmap(
+        directory + '/y.npy', mode='w+', dtype=np.float32, shape=(n, 1))
+    sw = np.lib.format.open_memmap(
+        directory + '/sw.npy', mode='w+', dtype=np.float32, shape=(n,))
+
+    cursor = services.sql.execute('select x, y, sw from computed_features order by id')
+    i = 0
+    while True:
+        rows = cursor.fetchmany(FEATURE_MATRIX_CHUNK_SIZE)
+        if len(rows) == 0:
+            break
+
+        chunk_positions = positions[i:i + len(rows)]
+        x[chunk_positions] = x_blobs_to_array([r['x'] for r in rows])
+        y[chunk_positions, 0] = [r['y'] for r in rows]
+        sw[chunk_positions] = [r['sw'] for r in rows]
+        i += len(rows)
+
+    x.flush()
+    y.flush()
+    sw.flush()
+
+    print(f'Wrote {n} x {num_features} feature matrix to {directory}')
+
+
+def load_feature_matrix(directory=FEATURE_MATRIX_DIR, limit=None):
+    """Memory-maps the matrix written by cache_feature_matrix"""
+    mapped_data = {
+        'x': np.load(directory + '/x.npy', mmap_mode='r'),
+        'y': np.load(directory + '/y.npy', mmap_mode='r'),
+        'sw': np.load(directory + '/sw.npy', mmap_mode='r')
+    }
+
+    if limit is not None:
+        mapped_data = {k: v[0:limit] for k, v in mapped_data.items()}
+
+    return mapped_data
+
+
+def split_mapped_data(mapped_data, test_size, val_size):
+    """
+    Splits already-shuffled mapped data, or just ids, into train, val and
+    test. The splits are ranges, so they're views into mapped_data rather than
+    copies. Sizes are rounded the same way as train_test_split.
+    """
+    n = len(next(iter(mapped_data.values())))
+    n_test = int(np.ceil(test_size * n))
+    n_val = int(np.ceil(val_size * (n - n_test)))
+
+    ranges = {
+        'test': slice(0, n_test),
+        'val': slice(n_test, n_test + n_val),
+        'train': slice(n_test + n_val, n)
+    }
+
+    return {
+        split: {k: v[r] for k, v in mapped_data.items()}
+        for split, r in ranges.items()
+    }
 
-        'age_at_time_of_game_avg': statistics.mean(age_at_time_of_games),
-        'age_at_time_of_game_min': min(age_at_time_of_games),
-        'age_at_time_of_game_max': max(age_at_time_of_games),
 
-        'experience_avg': statistics.mean(experiences),
-        'experience_min': min(experiences),
-        'experience_max': max(experiences),
+def _not_null(column):
+    return np.array([v for v in column if v is not None], dtype=np.float64) if column.dtype == object else column
 
-        'height_inches_avg': statistics.mean(height_inches),
-        'height_inches_min': min(height_inches),
-        'height_inches_max': max(height_inches),
 
-        'weight_lbs_avg': statistics.mean(weight_lbs),
-        'weight_lbs_min': min(weight_lbs),
-        'weight_lbs_max': max(weight_lbs),
+def _avg_min_max(name, column):
+    column = np.asarray(column)
+    return {
+        f'{name}_avg': float(np.mean(column)),
+        f'{name}_min': column.min().item(),
+        f'{name}_max': column.max().item()
+    }
 
-        'year_of_game_avg': statistics.mean(year_of_games),
-        'year_of_game_min': min(year_of_games),
-        'year_of_game_max': max(year_of_games),
 
-        'month_of_game_avg': statistics.mean(month_of_games),
-        'month_of_game_min': min(month_of_games),
-        'month_of_game_max': max(month_of_games),
+def get_stats():
+    print('Getting stats')
 
-        'day_of_game_avg': statistics.mean(day_of_games),
-        'day_of_game_min': min(day_of_games),
-        'day_of_game_max': max(day_of_games),
+    games_players = get_data()
 
-        'seconds_played_avg': statistics.mean(seconds_playeds),
-        'seconds_played_min': min(seconds_playeds),
-        'seconds_played_max': max(seconds_playeds),
+    print('..Calculating')
 
-        'dk_fantasy_points_per_minute_avg': statistics.mean(dk_fantasy_points_per_minutes),
-        'dk_fantasy_points_per_minute_min': min(dk_fantasy_points_per_minutes),
-        'dk_fantasy_points_per_minute_max': max(dk_fantasy_points_per_minutes),
+    opp_dk_fantasy_points_allowed_vs_position_last_games = _not_null(
+        games_players['opp_dk_fantasy_points_allowed_vs_position_last_game_only'])
+    dk_fantasy_points = _not_null(games_players['dk_fantasy_points'])
 
-        'dk_fantasy_points_allowed_vs_position_avg': statistics.mean(opp_dk_fantasy_points_allowed_vs_position_last_games),
-        'dk_fantasy_points_allowed_vs_position_min': min(opp_dk_fantasy_points_allowed_vs_position_last_games),
-        'dk_fantasy_points_allowed_vs_position_max': max(opp_dk_fantasy_points_allowed_vs_position_last_games),
+    assert len(opp_dk_fantasy_points_allowed_vs_position_last_games) > 500000
+    assert len(dk_fantasy_points) > 500000
 
-        'dk_fantasy_points_avg': statistics.mean(dk_fantasy_points),
-        'dk_fantasy_points_min': min(dk_fantasy_points),
-        'dk_fantasy_points_max': max(dk_fantasy_points)
+    stats = {
+        'time_of_first_game': min(games_players['time_of_game']),
+        'time_of_most_recent_game': max(games_players['time_of_game']),
+
+        **_avg_min_max('age_at_time_of_game', games_players['age_at_time_of_game']),
+        **_avg_min_max('experience', games_players['experience']),
+        **_avg_min_max('height_inches', games_players['height_inches']),
+        **_avg_min_max('weight_lbs', games_players['weight_lbs']),
+        **_avg_min_max('year_of_game', games_players['year_of_game']),
+        **_avg_min_max('month_of_game', games_players['month_of_game']),
+        **_avg_min_max('day_of_game', games_players['day_of_game']),
+        **_avg_min_max('seconds_played', games_players['seconds_played']),
+        **_avg_min_max('dk_fantasy_points_per_minute', games_players['dk_fantasy_points_per_minute']),
+        **_avg_min_max('dk_fantasy_points_allowed_vs_position', opp_dk_fantasy_points_allowed_vs_position_last_games),
+        **_avg_min_max('dk_fantasy_points', dk_fantasy_points)
     }
 
     print('..Done calculating')
@@ -822,20 +1799,19 @@ def get_stats():
 
 def get_players():
     rows = services.sql.execute(
-        '''
+        f'''
           select basketball_reference_id
           from players as p
           inner join teams_players as tp
             on tp.player_basketball_reference_id = p.basketball_reference_id
+          inner join player_season_stats as pss
+            on pss.player_basketball_reference_id = p.basketball_reference_id
+            and pss.season = tp.season
+            and {VALID_PLAYER_SEASON_SQL}
           where tp.season = 2019;
         '''
     ).fetchall()
 
-    valid_season_players = get_valid_season_players()
-    rows = filter(
-        lambda r: valid_season_players.get(f"2019_{r['basketball_reference_id']}"),
-        rows
-    )
     return set(map(lambda r: r['basketball_reference_id'], rows))
 
 
@@ -856,23 +1832,21 @@ def format_player_name(name):
 @functools.lru_cache()
 def get_players_by_team_and_formatted_name():
     players = services.sql.execute(
-        """
+        f"""
             select p.*, tp.team_basketball_reference_id
             from players as p
             inner join teams_players as tp on tp.player_basketball_reference_id = p.basketball_reference_id
-            where season = 2019
+            inner join player_season_stats as pss
+              on pss.player_basketball_reference_id = p.basketball_reference_id
+              and pss.season = tp.season
+              and {VALID_PLAYER_SEASON_SQL}
+            where tp.season = 2019
         """
     ).fetchall()
 
-    valid_season_players = get_valid_season_players()
-    players = list(filter(
-        lambda r: valid_season_players.get(f"2019_{r['basketball_reference_id']}"),
-        players
-    ))
-
     def tp_to_kv(tp):
-        key = f'{tp.team_basketball_reference_id} {format_player_name(tp.name)}'
-        return (key, tp.as_dict())
+        key = f"{tp['team_basketball_reference_id']} {format_player_name(tp['name'])}"
+        return (key, dict(tp))
 
     players_by_team_and_formatted_name = {
         k: v for k, v in map(tp_to_kv, players)
@@ -999,9 +1973,177 @@ def z_score_last_games(num, all_last_games, last_games):
     return np.array(encoded_last_games, dtype=np.float32)
 
 
+class LastGames:
+    """
+    A column of last games, as games_players_computed blobs or as lists (or
+    JSON) possibly holding Nones, as one padded matrix: each row's newest
+    non-null values left-aligned in `values` with `mask` marking them, and
+    aggregates over each whole list. `lengths` counts raw entries, Nones
+    included, and `counts` non-null ones
+    """
+
+    def __init__(self, column):
+        blobs = [
+            lg if isinstance(lg, bytes) else last_games_to_blob(lg)
+            for lg in column
+        ]
+        blobs = [b or b'' for b in blobs]
+
+        # Every blob is a multiple of 8 bytes, so rows start on float64 words
+        buffer = b''.join(blobs)
+        words = np.frombuffer(buffer, dtype='<f8')
+        halves = np.frombuffer(buffer, dtype='<u4')
+        sizes = np.array([len(b) // 8 for b in blobs], dtype=np.int64)
+        starts = np.cumsum(sizes) - sizes
+        present = sizes > 0
+
+        self.lengths = np.zeros(len(blobs), dtype=np.int64)
+        self.counts = np.zeros(len(blobs), dtype=np.int64)
+        self.lengths[present] = halves[starts[present] * 2]
+        self.counts[present] = halves[starts[present] * 2 + 1]
+
+        has_aggregates = self.counts > LAST_GAMES_WINDOW
+        window_starts = starts + 1 + np.where(has_aggregates, 4, 0)
+        self.mask = np.arange(LAST_GAMES_WINDOW) < np.minimum(self.counts, LAST_GAMES_WINDOW)[:, None]
+        self.values = np.zeros((len(blobs), LAST_GAMES_WINDOW))
+        self.values[self.mask] = words[(window_starts[:, None] + np.arange(LAST_GAMES_WINDOW))[self.mask]]
+
+        # Lists that fit in the window have their aggregates worked out here
+        oldest_first = np.where(self.mask, self.values, 0)[:, ::-1]
+        self.sums = oldest_first.sum(axis=1)
+        self.sum_squares = (oldest_first ** 2).sum(axis=1)
+        self.mins = np.where(self.mask, self.values, np.inf).min(axis=1)
+        self.maxs = np.where(self.mask, self.values, -np.inf).max(axis=1)
+        for i, aggregate in enumerate([self.sums, self.sum_squares, self.mins, self.maxs]):
+            aggregate[has_aggregates] = words[starts[has_aggregates] + 1 + i]
+
+    def head(self, num):
+        """The first num non-null values of each row, and their mask"""
+        assert num <= LAST_GAMES_WINDOW
+        return self.values[:, :num], self.mask[:, :num]
+
+    def means(self):
+        """
+        Means of each whole list, 0 for empty ones. Lists of one repeated
+        value get exactly that value, as statistics.mean gives
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts
+        means = np.where(self.mins == self.maxs, self.mins, means)
+        return np.where(self.counts == 0, 0, means)
+
+    def stdevs(self):
+        """Sample stdevs of each whole list, exactly 0 for one repeated value"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ss = self.sum_squares - self.sums ** 2 / self.counts
+            stdevs = np.sqrt(np.maximum(ss, 0) / (self.counts - 1))
+        return np.where(self.mins == self.maxs, 0, stdevs)
+
+
+def _masked_mean(values, mask):
+    """
+    Row means over the masked values, 0 for empty rows. Rows of one repeated
+    value get exactly that value, as statistics.mean gives
+    """
+    counts = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(mask, values, 0).sum(axis=1) / counts
+    row_min = np.where(mask, values, np.inf).min(axis=1, initial=np.inf)
+    row_max = np.where(mask, values, -np.inf).max(axis=1, initial=-np.inf)
+    means = np.where(row_min == row_max, row_min, means)
+    return np.where(counts == 0, 0, means)
+
+
+def _masked_stdev(values, mask, means):
+    """
+    Row sample stdevs around means, like statistics.stdev, with the same
+    correction for error in the mean. Rows of one repeated value get exactly 0
+    """
+    counts = mask.sum(axis=1)
+    deviations = np.where(mask, values - means[:, None], 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ss = (deviations ** 2).sum(axis=1) - deviations.sum(axis=1) ** 2 / counts
+        stdevs = np.sqrt(np.maximum(ss, 0) / (counts - 1))
+    row_min = np.where(mask, values, np.inf).min(axis=1, initial=np.inf)
+    row_max = np.where(mask, values, -np.inf).max(axis=1, initial=-np.inf)
+    return np.where(row_min == row_max, 0, stdevs)
+
+
+def last_games_transform_many(num, encode_many, last_games):
+    """last_games_transform for a LastGames batch"""
+    values, mask = last_games.head(num)
+    encoded = encode_many(np.where(mask, values, last_games.means()[:, None]))
+    return np.where((last_games.lengths == 0)[:, None], 0.1, encoded)
+
+
+def avg_last_five_over_avg_all_many(last_games):
+    """avg_last_five_over_avg_all for a LastGames batch"""
+    has_games = last_games.counts > 0
+    mean_all = last_games.means()
+    if np.any(mean_all[has_games] == 0):
+        raise ZeroDivisionError('float division by zero')
+
+    mean_l5 = _masked_mean(*last_games.head(5))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(has_games, mean_l5 / mean_all, 0)
+
+
+def days_since_last_game_many(dts_column, game_dates, enc_many):
+    """days_since_last_game for columns of last game times and game dates"""
+    last_dts = []
+    for dts in dts_column:
+        real_dts = [dt for dt in (parse_json_field(dts) or []) if dt is not None]
+        last_dts.append(real_dts[0] if len(real_dts) > 0 else None)
+
+    has_game = np.array([dt is not None for dt in last_dts], dtype=bool)
+    seconds = (
+        np.array(list(game_dates), dtype='datetime64[s]') -
+        np.array([dt if dt is not None else 'NaT' for dt in last_dts], dtype='datetime64[s]')
+    )
+    # TODO Replace w/ actual avg of days since
+    days = np.where(has_game, seconds.astype(np.int64) // (24 * 60 * 60), 30)
+    return enc_many(days)
+
+
+def sd_last_five_games_many(last_games):
+    """sd_last_five_games for a LastGames batch"""
+    values, mask = last_games.head(5)
+    stdevs = _masked_stdev(values, mask, _masked_mean(values, mask))
+    return np.where(last_games.counts < 2, 0, stdevs)
+
+
+def z_score_last_games_many(num, all_last_games, last_games):
+    """z_score_last_games for LastGames batches"""
+    all_means = all_last_games.means()
+    all_stdevs = all_last_games.stdevs()
+    all_stdevs = np.where(all_stdevs == 0, 1, all_stdevs)
+
+    values, mask = last_games.head(num)
+    z_scores = (np.where(mask, values, last_games.means()[:, None]) - all_means[:, None]) / all_stdevs[:, None]
+    encoded = 0.1 + ((2 + z_scores) / 4)
+
+    too_few = (all_last_games.counts < 2) | (last_games.counts < 2)
+    return np.where(too_few[:, None], 0, encoded)
+
+
+MAPPERS_VERSION = 1
+
+
 class Mappers:
-    def __init__(self):
-        self.stats = get_stats()
+    """
+    Encoders for datums. Built from the database by default, or from the
+    state saved with a model so inference encodes exactly as training did
+    """
+
+    def __init__(self, state=None):
+        if state is None:
+            state = {
+                'stats': get_stats(),
+                'teams': get_teams(),
+                'players': sorted(get_players()),
+                'positions': get_positions()
+            }
+        self.stats = state['stats']
 
         self.age_enc = MeanMinMaxEncoder(
             self.stats['age_at_time_of_game_avg'],
@@ -1076,17 +2218,41 @@ class Mappers:
         )
 
         self.teams_enc = LabelBinarizer()
-        self.teams_enc.fit(get_teams())
+        self.teams_enc.fit(state['teams'])
         print(self.teams_enc.classes_)
 
-        self.players = get_players()
+        self.players = set(state['players'])
         self.players_enc = MultiLabelBinarizer()
         self.players_enc.fit([self.players])
 
         self.positions_enc = LabelBinarizer()
-        self.positions_enc.fit(get_positions())
+        self.positions_enc.fit(state['positions'])
         print(self.positions_enc.classes_)
 
+        self.teams_indexes = {c: i for i, c in enumerate(self.teams_enc.classes_)}
+        self.positions_indexes = {c: i for i, c in enumerate(self.positions_enc.classes_)}
+
+    def to_state(self):
+        return {
+            'version': MAPPERS_VERSION,
+            'stats': self.stats,
+            'teams': self.teams_enc.classes_.tolist(),
+            'players': sorted(self.players),
+            'positions': self.positions_enc.classes_.tolist()
+        }
+
+    def save(self, path):
+        with open(path, 'w') as fp:
+            json.dump(self.to_state(), fp)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as fp:
+            state = json.loads(fp.read())
+        if state.get('version') != MAPPERS_VERSION:
+            raise ValueError(
+                f"Mappers at {path} are version {state.get('version')}, expected {MAPPERS_VERSION}")
+        return cls(state)
 
     def datum_to_x(self, d):
         return np.concatenate((
@@ -1153,6 +2319,94 @@ class Mappers:
             # [0.1 if d == 0 else 0.9 for d in self.players_enc.transform([[d['player_basketball_reference_id']]]).flatten()]
         )).astype(np.float32)
 
+    def _one_hot(self, enc, indexes, values):
+        # LabelBinarizer only gives one column for two classes
+        if len(enc.classes_) <= 2:
+            return np.where(enc.transform(list(values)) == 0, 0.1, 0.9)
+
+        columns = np.array([indexes.get(v, -1) for v in values], dtype=np.int64)
+        known = np.nonzero(columns >= 0)[0]
+        encoded = np.full((len(columns), len(enc.classes_)), 0.1)
+        encoded[known, columns[known]] = 0.9
+        return encoded
+
+    def datums_to_X(self, columns):
+        """
+        datum_to_x for a whole batch, given as columns (see datums_to_columns),
+        into one float32 matrix
+        """
+        n = len(columns['age_at_time_of_game'])
+
+        def flags(values):
+            return np.where(np.array(values, dtype=bool), 0.9, 0.1)
+
+        parsed_last_games = {}
+
+        def lg(column):
+            if column not in parsed_last_games:
+                parsed_last_games[column] = LastGames(columns[column])
+            return parsed_last_games[column]
+
+        def last_games(num, encoder, column):
+            return last_games_transform_many(num, encoder.transform_many, lg(column))
+
+        seconds_played_avg = self.seconds_played_enc.transform(self.stats['seconds_played_avg'])
+        avg_last_five_over_avg_all = avg_last_five_over_avg_all_many(lg('seconds_played_last_games'))
+
+        blocks = [
+            self.age_enc.transform_many(columns['age_at_time_of_game']),
+            self.height_inches_enc.transform_many(columns['height_inches']),
+            self.weight_lbs_enc.transform_many(columns['weight_lbs']),
+            self.experience_enc.transform_many(columns['experience']),
+            flags(columns['playing_at_home']),
+            flags(columns['starter']),
+            self.year_of_game_enc.transform_many(columns['year_of_game']),
+            self.month_of_game_enc.transform_many(columns['month_of_game']),
+            self.day_of_game_enc.transform_many(columns['day_of_game']),
+
+            last_games(5, self.dk_fantasy_points_enc, 'dk_fantasy_points_last_games'),
+            last_games(2, self.dk_fantasy_points_enc, 'dk_fantasy_points_last_games_against_opp_away'),
+            last_games(2, self.dk_fantasy_points_enc, 'dk_fantasy_points_last_games_against_opp_home'),
+
+            last_games(5, self.seconds_played_enc, 'seconds_played_last_games'),
+            last_games(2, self.seconds_played_enc, 'seconds_played_last_games_against_opp_away'),
+            last_games(2, self.seconds_played_enc, 'seconds_played_last_games_against_opp_home'),
+
+            last_games(5, self.dk_fantasy_points_per_minute_enc, 'dk_fantasy_points_per_minute_last_games'),
+            last_games(2, self.dk_fantasy_points_per_minute_enc, 'dk_fantasy_points_per_minute_last_games_against_opp_away'),
+            last_games(2, self.dk_fantasy_points_per_minute_enc, 'dk_fantasy_points_per_minute_last_games_against_opp_home'),
+
+            last_games(5, self.seconds_played_enc, 'opp_dk_fantasy_points_allowed_vs_position_last_games'),
+            last_games(2, self.seconds_played_enc, 'opp_dk_fantasy_points_allowed_vs_position_last_games_away'),
+            last_games(2, self.seconds_played_enc, 'opp_dk_fantasy_points_allowed_vs_position_last_games_home'),
+
+            self._one_hot(self.teams_enc, self.teams_indexes, columns['player_team_basketball_reference_id']),
+            self._one_hot(self.teams_enc, self.teams_indexes, columns['opposing_team_basketball_reference_id']),
+
+            self._one_hot(self.positions_enc, self.positions_indexes, columns['position']),
+
+            # Odd features
+
+            np.where(avg_last_five_over_avg_all == 0, seconds_played_avg, avg_last_five_over_avg_all),
+            days_since_last_game_many(
+                columns['times_of_last_games_against_opp_away'], columns['time_of_game'],
+                self.days_since_last_game_against_opp_enc.transform_many),
+            days_since_last_game_many(
+                columns['times_of_last_games_against_opp_home'], columns['time_of_game'],
+                self.days_since_last_game_against_opp_enc.transform_many),
+            self.dk_fantasy_points_enc.transform_many(
+                sd_last_five_games_many(lg('dk_fantasy_points_last_games'))),
+
+            z_score_last_games_many(5, lg('dk_fantasy_points_last_games'), lg('dk_fantasy_points_last_games')),
+            z_score_last_games_many(
+                5,
+                lg('opp_dk_fantasy_points_allowed_vs_position_last_games'),
+                lg('opp_dk_fantasy_points_allowed_vs_position_last_games'))
+        ]
+
+        return np.concatenate(
+            [b.reshape(n, -1) for b in blocks], axis=1).astype(np.float32)
+
     def datum_to_y(self, d):
         return [d['dk_fantasy_points'] or 0]
 
@@ -1188,6 +2442,13 @@ class Mappers:
         return {'dk_fantasy_points': round(y[0], 2)}
 
 
+def datums_to_columns(datums):
+    """A list of datums as a dict of columns, for Mappers.datums_to_X"""
+    if len(datums) == 0:
+        return {}
+    return {key: [d[key] for d in datums] for key in datums[0]}
+
+
 @functools.lru_cache()
 def make_mappers():
     return Mappers()
@@ -1224,8 +2485,14 @@ if __name__ == '__main__':
     arg = sys.argv[1]
     if arg == 'cache-data':
         cache_data()
+    elif arg == 'player-season-stats':
+        update_player_season_stats()
     elif arg == 'cache-features':
         cache_features()
+    elif arg == 'refresh-data':
+        refresh_data()
+    elif arg == 'cache-feature-matrix':
+        cache_feature_matrix()
     elif arg == 'get-mapped-data-debug':
         mapped_data = get_mapped_data(limit=10, player_basketball_reference_id='hardeja01')
         pprint.pprint(mapped_data['og'][9])
@@ -1,6 +1,10 @@
 import re
 import datetime
+import heapq
+import functools
 import itertools
+import multiprocessing
+import os
 
 import scipy
 import pandas as pd
@@ -15,7 +19,18 @@ import model
 import scraping
 
 
+def _utc(time_of_game):
+    """A parsed time of game as naive UTC, the way games.time_of_game keeps it"""
+    if time_of_game.tzinfo is None:
+        return time_of_game
+    return time_of_game.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
 def embellish_salary_data(salary_df):
+    """
+    The parsed salary file's players, each with the columns data.query_data
+    gives a box score, as of their game, so the models can score them
+    """
     parsed_players = []
     widgets = [
         ' [', progressbar.Timer(), '] ',
@@ -23,36 +38,42 @@ def embellish_salary_data(salary_df):
         ' (', progressbar.ETA(), ') '
     ]
 
+    pbtfn = data.get_players_by_team_and_formatted_name()
+    lineups = scraping.get_lineups(datetime.date.today())
+    no_lineup = {'starters': [], 'injured': []}
+
+    def starters(team):
+        return [
+            pbtfn[f"{d['team']} {d['name']}"]['basketball_reference_id']
+            for d in lineups.get(team, no_lineup)['starters']
+        ]
+
     for i in progressbar.progressbar(range(len(salary_df)), widgets=widgets):
         row = salary_df.iloc[i]
-        now = datetime.datetime.now()
+        time_of_game = _utc(row['Time of Game'])
+        current_game_date = time_of_game.strftime('%Y-%m-%d %H:%M:%S')
         formatted_name = data.format_player_name(row['Name'])
-
-        stats_last_games = data.get_stats_last_games_from_pg(
-            player_basketball_reference_id=row['basketball_reference_id'],
-            season=2019,
-            current_game_date=now
-        )
-
-        away_stats_last_games = data.team_get_stats_last_games_from_pg(
-            team_basketball_reference_id=row['Away Team'],
-            season=2019,
-            current_game_date=now
-        )
-
-        home_stats_last_games = data.team_get_stats_last_games_from_pg(
-            team_basketball_reference_id=row['Home Team'],
-            season=2019,
-            current_game_date=now
-        )
-
-        pbtfn = data.get_players_by_team_and_formatted_name()
-        lineups = scraping.get_lineups()
-        team_lineup = lineups[row['Player Team']]
-        away_starters = [pbtfn['{team} {name}'.format(
-            team=d['team'], name=d['name'])]['basketball_reference_id'] for d in lineups[row['Away Team']]['starters']]
-        home_starters = [pbtfn['{team} {name}'.format(
-            team=d['team'], name=d['name'])]['basketball_reference_id'] for d in lineups[row['Home Team']]['starters']]
+        player_team = row['Player Team']
+        opp_team = row['Home Team'] if player_team == row['Away Team'] else row['Away Team']
+
+        def stats_last_games(away_team=None, home_team=None):
+            return data.get_stats_last_games_from_pg(
+                player_basketball_reference_id=row['basketball_reference_id'],
+                season=2019,
+                current_game_date=current_game_date,
+                player_team=player_team,
+                opp_team=opp_team,
+                player_position=row['position'],
+                away_team=away_team,
+                home_team=home_team
+            )
+
+        # Same as data.cache_single_games_player
+        stats = stats_last_games()
+        stats_against_opp_away = stats_last_games(away_team=player_team, home_team=opp_team)
+        stats_against_opp_home = stats_last_games(away_team=opp_team, home_team=player_team)
+
+        team_lineup = lineups.get(player_team, no_lineup)
 
         parsed_player = {
             'name': row['Name'],
@@ -60,45 +81,60 @@ def embellish_salary_data(salary_df):
             'avg_points_per_game': row['AvgPointsPerGame'],
             'roster_positions': row['Roster Position'],
             'player_basketball_reference_id': row['basketball_reference_id'],
-            'player_team_basketball_reference_id': row['Player Team'],
-            'opposing_team_basketball_reference_id':
-            row['Home Team'] if row['Player Team'] == row['Away Team'] else row['Away Team'],
-            'position': row['Position'][0],
-            'age_at_time_of_game': int((row['Time of Game'].date() - row['date_of_birth']).days / 365),
-            'year_of_game': row['Time of Game'].year,
-            'month_of_game': row['Time of Game'].month,
-            'day_of_game': row['Time of Game'].day,
-            'hour_of_game': row['Time of Game'].hour,
+            'player_team_basketball_reference_id': player_team,
+            'opposing_team_basketball_reference_id': opp_team,
+            'position': row['position'],
+            'time_of_game': current_game_date,
+            'age_at_time_of_game': (time_of_game - datetime.datetime.strptime(row['date_of_birth'], '%Y-%m-%d')).days // 365,
+            'year_of_game': time_of_game.year,
+            'month_of_game': time_of_game.month,
+            'day_of_game': time_of_game.day,
+            'hour_of_game': time_of_game.hour,
+            'height_inches': row['height_inches'],
+            'weight_lbs': row['weight_lbs'],
             'experience': row['experience'],
-            'playing_at_home': row['Player Team'] == row['Home Team'],
-
-            **stats_last_games,
-
-            'away_wins': away_stats_last_games['wins'],
-            'away_losses': away_stats_last_games['losses'],
-            'home_wins': home_stats_last_games['wins'],
-            'home_losses': home_stats_last_games['losses'],
-            'away_dk_fantasy_points_allowed_last_games':
-            away_stats_last_games['dk_fantasy_points_allowed_last_games'],
-            'home_dk_fantasy_points_allowed_last_games':
-            home_stats_last_games['dk_fantasy_points_allowed_last_games'],
+            'playing_at_home': player_team == row['Home Team'],
+
+            'times_of_last_games': stats['times_of_games'],
+            'times_of_last_games_against_opp_away': stats_against_opp_away['times_of_games'],
+            'times_of_last_games_against_opp_home': stats_against_opp_home['times_of_games'],
+            'opp_dk_fantasy_points_allowed_vs_position_last_games':
+            stats['opp_dk_fantasy_points_allowed_vs_position_last_games'],
+            'opp_dk_fantasy_points_allowed_vs_position_last_games_away':
+            stats_against_opp_away['opp_dk_fantasy_points_allowed_vs_position_last_games'],
+            'opp_dk_fantasy_points_allowed_vs_position_last_games_home':
+            stats_against_opp_home['opp_dk_fantasy_points_allowed_vs_position_last_games'],
 
             'starter': len([d for d in team_lineup['starters'] if d['name'] == formatted_name]) > 0,
             'injured': len([d for d in team_lineup['injured'] if d['name'] == formatted_name]) > 0,
-            'away_starters': away_starters,
-            'home_starters': home_starters
+            'away_starters': starters(row['Away Team']),
+            'home_starters': starters(row['Home Team'])
         }
+        for stat in [
+            'dk_fantasy_points_last_games',
+            'seconds_played_last_games',
+            'plus_minus_last_games',
+            'dk_fantasy_points_per_minute_last_games'
+        ]:
+            parsed_player[stat] = stats[stat]
+            parsed_player[f'{stat}_against_opp_away'] = stats_against_opp_away[stat]
+            parsed_player[f'{stat}_against_opp_home'] = stats_against_opp_home[stat]
         parsed_players.append(parsed_player)
 
     return pd.DataFrame(parsed_players)
 
 
+def _avg_last_five(last_games):
+    """Games the player sat out count as 0 points"""
+    return sum(p or 0 for p in last_games[0:5]) / 5
+
+
 def filter_players(df):
     filtered_data = []
     for i, row in df.iterrows():
         if row['injured'] and not row['starter']:
             continue
-        if sum(row['dk_fantasy_points_last_games'][0:5]) / 5 < 5 and row['avg_points_per_game'] < 5:
+        if _avg_last_five(row['dk_fantasy_points_last_games']) < 5 and row['avg_points_per_game'] < 5:
             continue
 
         filtered_data.append(row)
@@ -109,8 +145,11 @@ def filter_players(df):
 def predict_with_player_models(df):
     model_name = model.get_latest_model_name()
     default_model, default_losses = model.load_model(model_name)
+    losses_by_player = model.load_player_losses(model_name)
+    mappers = model.load_mappers(model_name)
 
-    predictions = []
+    batch = []
+    batch_losses = []
     widgets = [
         ' [', progressbar.Timer(), '] ',
         progressbar.Bar(),
@@ -118,18 +157,23 @@ def predict_with_player_models(df):
     ]
     for i in progressbar.progressbar(range(len(df)), widgets=widgets):
         d = df.iloc[i]
-        player_model = default_model
-        player_losses = default_losses
-        try:
-            __, player_losses = model.load_model(
-                model_name + '/' + d['player_basketball_reference_id'])
-        except OSError:
+        player_losses = losses_by_player.get(d['player_basketball_reference_id'])
+        if player_losses is None:
             # Filter players who don't have their own model, aka, who don't
             # have enough games for good predictions
             continue
 
-        prediction = model.predict(player_model, player_losses, [d.to_dict()])
-        predictions.append(prediction[0])
+        batch.append(d.to_dict())
+        batch_losses.append(player_losses)
+
+    if len(batch) == 0:
+        return pd.DataFrame([])
+
+    # Every player is scored by the default model, so the whole slate is a
+    # single predict call; only the losses differ per player
+    predictions = model.predict(default_model, default_losses, batch, mappers=mappers)
+    for prediction, player_losses in zip(predictions, batch_losses):
+        prediction['_losses'] = player_losses
 
     return pd.DataFrame(predictions)
 
@@ -185,7 +229,7 @@ AVG_POINTS_LIMIT = 15
 def filter_players_before_picking_roster(df):
     filtered_data = []
     for i, row in df.iterrows():
-        if sum(row['dk_fantasy_points_last_games'][0:5]) / 5 < AVG_POINTS_LIMIT and row['avg_points_per_game'] < AVG_POINTS_LIMIT:
+        if _avg_last_five(row['dk_fantasy_points_last_games']) < AVG_POINTS_LIMIT and row['avg_points_per_game'] < AVG_POINTS_LIMIT:
             continue
         if not row['starter']:
             continue
@@ -199,104 +243,373 @@ MIN_SPEND = 45000
 BUDGET = 50000
 MIN_ACCEPTABLE_POINTS = 200
 DIFFERENCE_BETWEEN_ROSTERS = 6
-N = 42
+N = 80
 k = 8
 
 
-def _is_valid_roster(roster):
-    positions = {
-        'PG': None,
-        'SG': None,
-        'SF': None,
-        'PF': None,
-        'C': None,
-        'G': None,
-        'F': None,
-        'UTIL': None
-    }
+ROSTERS_TO_CONSIDER = 10000
+# DraftKings salaries are in hundreds of dollars
+SALARY_UNIT = 100
+# Points for rosters that can't be filled, below any real roster's
+NO_POINTS = -10 ** 9
+LINEUPS_TO_PICK = 5
+ROSTER_POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C', 'G', 'F', 'UTIL']
 
-    for player in roster:
-        position_found_for_player = False
-        for roster_position in player['roster_positions']:
-            if positions[roster_position] is None:
-                positions[roster_position] = player
-                position_found_for_player = True
-                break
 
-        if not position_found_for_player:
-            return False
+ALL_ROSTER_SLOTS = (1 << len(ROSTER_POSITIONS)) - 1
 
-    return True
 
+def _roster_mask(player):
+    """Bitmask of the ROSTER_POSITIONS slots player can fill"""
+    mask = 0
+    for roster_position in player['roster_positions']:
+        if roster_position in ROSTER_POSITIONS:
+            mask |= 1 << ROSTER_POSITIONS.index(roster_position)
+    return mask
 
-def pick_lineups(df):
-    rosters = []
-    limited_n = min(len(df), N)
 
-    print({'nCk': scipy.misc.comb(limited_n, k)})
+@functools.lru_cache(maxsize=None)
+def _roster_slot_sets(masks):
+    """
+    Every set of slots, as a bitmask, that players with the given sorted
+    tuple of masks can fill with one player per slot. Empty if they can't
+    all get a slot.
+    """
+    if len(masks) == 0:
+        return frozenset([0])
 
-    sorted_players = sorted(df.to_dict(
-        'records'), key=lambda d: d['adjusted_dollars_per_fantasy_point'])
-    combo_iter = itertools.combinations(sorted_players[0:limited_n], k)
-    rosters = []
+    slot_sets = set()
+    for slots in _roster_slot_sets(masks[:-1]):
+        free = masks[-1] & ~slots
+        while free:
+            slot = free & -free
+            slot_sets.add(slots | slot)
+            free &= ~slot
 
-    widgets = [
-        ' [', progressbar.Timer(), '] ',
-        progressbar.Bar(),
-        ' (', progressbar.ETA(), ') '
-    ]
+    return frozenset(slot_sets)
 
-    for i in progressbar.progressbar(range(int(scipy.misc.comb(limited_n, k))), widgets=widgets):
-        try:
-            roster = next(combo_iter)
-        except StopIteration:
-            break
 
-        salary = sum([int(d['salary_dollars']) for d in roster])
-        if salary < MIN_SPEND or salary > BUDGET:
-            continue
+@functools.lru_cache(maxsize=None)
+def _can_fill_roster(masks, available_slots):
+    """
+    Whether players with the given sorted tuple of masks can take a slot
+    each and leave only slots in available_slots open
+    """
+    return any(
+        ALL_ROSTER_SLOTS & ~slots & ~available_slots == 0
+        for slots in _roster_slot_sets(masks)
+    )
 
-        expected_points = sum(
-            [int(d['70_pct_conf']) for d in roster])
-        if (expected_points < MIN_ACCEPTABLE_POINTS):
-            continue
 
-        if not _is_valid_roster(roster):
+def _is_valid_roster(roster):
+    masks = tuple(sorted(_roster_mask(player) for player in roster))
+    return len(_roster_slot_sets(masks)) > 0
+
+
+class _TopRosters:
+    """
+    The best `size` rosters seen so far, as a min-heap of
+    (expected_points, player indices, total_salary). Ties on points are
+    broken by combination order, later first, which is the order the brute
+    force's stable sort and reverse put them in.
+
+    shared_min_points, when given, is a floor on the points of the overall
+    top rosters that's shared between processes searching different shards.
+    Any one shard's worst top roster is such a floor.
+    """
+
+    def __init__(self, size, min_acceptable_points, shared_min_points=None, shared_lock=None):
+        self.size = size
+        self.min_acceptable_points = min_acceptable_points
+        self.shared_min_points = shared_min_points
+        self.shared_lock = shared_lock
+        self.heap = []
+        # Set to a list to collect the items that make it into the heap
+        self.pushed = None
+
+    def min_points(self):
+        min_points = self.min_acceptable_points
+        if len(self.heap) == self.size:
+            min_points = max(min_points, self.heap[0][0])
+        if self.shared_min_points is not None:
+            min_points = max(min_points, self.shared_min_points.value)
+        return min_points
+
+    def push(self, item):
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+        else:
+            return
+
+        if self.pushed is not None:
+            self.pushed.append(item)
+
+        if self.shared_min_points is not None and len(self.heap) == self.size:
+            with self.shared_lock:
+                if self.heap[0][0] > self.shared_min_points.value:
+                    self.shared_min_points.value = self.heap[0][0]
+
+    def best(self):
+        return sorted(self.heap, reverse=True)
+
+
+def _roster_search_tables(players):
+    """
+    Per-player values and suffix bounds used by _search_rosters. Players are
+    searched most points first, so good rosters, and a high floor to prune
+    on, turn up early. `order` maps search positions back to players.
+    """
+    n = len(players)
+    order = sorted(range(n), key=lambda i: (-int(players[i]['70_pct_conf']), i))
+    players = [players[i] for i in order]
+    salaries = [int(p['salary_dollars']) for p in players]
+    points = [int(p['70_pct_conf']) for p in players]
+    masks = [_roster_mask(p) for p in players]
+
+    # Slots that players[i:] can fill between them
+    suffix_masks = [0] * (n + 1)
+    for i in reversed(range(n)):
+        suffix_masks[i] = suffix_masks[i + 1] | masks[i]
+
+    # For players[i:], the least and most salary that r of them add up to
+    min_salary = []
+    max_salary = []
+    for i in range(n + 1):
+        suffix_salaries = sorted(salaries[i:])
+        min_salary.append([sum(suffix_salaries[0:r]) for r in range(k + 1)])
+        max_salary.append([sum(suffix_salaries[len(suffix_salaries) - r:]) for r in range(k + 1)])
+
+    # For players[i:], the most points r of them add up to for at most c
+    # SALARY_UNITs of salary. Salaries are rounded down to units, which can
+    # only raise the bound
+    units = BUDGET // SALARY_UNIT
+    max_points = [None] * (n + 1)
+    max_points[n] = [[0] * (units + 1)] + [[NO_POINTS] * (units + 1) for r in range(k)]
+    for i in reversed(range(n)):
+        cost = salaries[i] // SALARY_UNIT
+        max_points[i] = [list(by_units) for by_units in max_points[i + 1]]
+        for r in range(1, k + 1):
+            fewer = max_points[i + 1][r - 1]
+            by_units = max_points[i][r]
+            for c in range(cost, units + 1):
+                if fewer[c - cost] + points[i] > by_units[c]:
+                    by_units[c] = fewer[c - cost] + points[i]
+
+    return {
+        'n': n,
+        'order': order,
+        'salaries': salaries,
+        'points': points,
+        'masks': masks,
+        'suffix_masks': suffix_masks,
+        'min_salary': min_salary,
+        'max_salary': max_salary,
+        'max_points': max_points,
+        'rosters_to_consider': ROSTERS_TO_CONSIDER,
+        'min_acceptable_points': MIN_ACCEPTABLE_POINTS,
+        'min_spend': MIN_SPEND,
+        'budget': BUDGET
+    }
+
+
+def _search_rosters(tables, roster, top_rosters):
+    """
+    Branch and bound over the combinations that start with roster, a tuple
+    of search positions, walked depth first in itertools.combinations order.
+    A branch is cut when the cheapest or most expensive way to finish it
+    can't land between MIN_SPEND and BUDGET, when the most points the
+    players still to come can add within the salary left are below the worst
+    roster in top_rosters, or when the slots its players leave open can't be
+    filled by the players still to come. Rosters are pushed as the players'
+    indices, so top_rosters breaks ties the same whatever the search order.
+    """
+    n = tables['n']
+    order = tables['order']
+    salaries = tables['salaries']
+    points = tables['points']
+    masks = tables['masks']
+    suffix_masks = tables['suffix_masks']
+    min_salary = tables['min_salary']
+    max_salary = tables['max_salary']
+    max_points = tables['max_points']
+    min_spend = tables['min_spend']
+    budget = tables['budget']
+
+    def search(start, roster, roster_masks, salary, expected_points):
+        remaining = k - len(roster)
+
+        if remaining == 0:
+            if salary < min_spend or salary > budget or expected_points < top_rosters.min_points():
+                return
+
+            top_rosters.push((expected_points, tuple(sorted(order[i] for i in roster)), salary))
+            return
+
+        units_left = (budget - salary) // SALARY_UNIT
+        for i in range(start, n - remaining + 1):
+            # Each bound only gets tighter as i moves right
+            if salary + min_salary[i][remaining] > budget:
+                break
+            if salary + max_salary[i][remaining] < min_spend:
+                break
+            if expected_points + max_points[i][remaining][units_left] < top_rosters.min_points():
+                break
+
+            next_roster_masks = tuple(sorted(roster_masks + (masks[i],)))
+            if not _can_fill_roster(next_roster_masks, suffix_masks[i + 1]):
+                continue
+
+            search(
+                i + 1,
+                roster + (i,),
+                next_roster_masks,
+                salary + salaries[i],
+                expected_points + points[i]
+            )
+
+    roster_masks = tuple(sorted(masks[i] for i in roster))
+    if len(roster) > 0 and not _can_fill_roster(roster_masks, suffix_masks[roster[-1] + 1]):
+        return
+
+    search(
+        roster[-1] + 1 if len(roster) > 0 else 0,
+        roster,
+        roster_masks,
+        sum(salaries[i] for i in roster),
+        sum(points[i] for i in roster)
+    )
+
+
+def _rosters_from_heap(players, items):
+    return [{
+        'df': tuple(players[i] for i in roster),
+        'total_salary': salary,
+        'expected_points': expected_points
+    } for expected_points, roster, salary in items]
+
+
+def _find_rosters(players):
+    """
+    The rosters of k players that a brute force over
+    itertools.combinations(players, k) would keep in its top
+    ROSTERS_TO_CONSIDER by expected_points, best first, as
+    (expected_points, player indices, total_salary)
+    """
+    tables = _roster_search_tables(players)
+    top_rosters = _TopRosters(
+        tables['rosters_to_consider'], tables['min_acceptable_points'])
+    _search_rosters(tables, (), top_rosters)
+
+    return top_rosters.best()
+
+
+LINEUP_PROCESSES = int(os.environ.get(
+    'LINEUP_PROCESSES', max(1, multiprocessing.cpu_count() - 1)))
+# Leading players per shard of the parallel search. One leading player
+# would leave the shard starting with the first player with ~k/N of all the
+# work, so shards are split on the first two.
+LINEUP_SHARD_PREFIX_LENGTH = 2
+
+_shard_tables = None
+_shard_top_rosters = None
+
+
+def _init_shard_worker(tables, shared_min_points, shared_lock):
+    global _shard_tables, _shard_top_rosters
+    _shard_tables = tables
+    # Kept across all the shards a worker searches, so it fills up and
+    # starts pruning after the first few
+    _shard_top_rosters = _TopRosters(
+        tables['rosters_to_consider'],
+        tables['min_acceptable_points'],
+        shared_min_points,
+        shared_lock
+    )
+
+
+def _search_shard(prefix):
+    _shard_top_rosters.pushed = []
+    _search_rosters(_shard_tables, prefix, _shard_top_rosters)
+
+    # Only what this shard added, less what's already been beaten
+    min_points = _shard_top_rosters.min_points()
+    return [item for item in _shard_top_rosters.pushed if item[0] >= min_points]
+
+
+def _find_rosters_parallel(players, processes=LINEUP_PROCESSES):
+    """
+    _find_rosters split across a process pool by the leading players of
+    each combination. Each worker keeps its own top ROSTERS_TO_CONSIDER,
+    and merging them gives the same rosters in the same order. Workers
+    share the best floor any of them has found so they prune like the
+    serial search does.
+    """
+    tables = _roster_search_tables(players)
+    prefixes = list(itertools.combinations(
+        range(max(len(players) - k + LINEUP_SHARD_PREFIX_LENGTH, 0)), LINEUP_SHARD_PREFIX_LENGTH))
+
+    top_rosters = _TopRosters(
+        tables['rosters_to_consider'], tables['min_acceptable_points'])
+    # Read on every bound check, so unsynchronized, with writes under a lock
+    shared_min_points = multiprocessing.RawValue('i', tables['min_acceptable_points'])
+    shared_lock = multiprocessing.Lock()
+
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_shard_worker,
+        initargs=(tables, shared_min_points, shared_lock)
+    ) as p:
+        for heap in p.imap_unordered(_search_shard, prefixes):
+            for item in heap:
+                top_rosters.push(item)
+
+    return top_rosters.best()
+
+
+def _different_rosters(players, items):
+    """
+    Walks rosters best first, keeping each one that swaps out at least
+    DIFFERENCE_BETWEEN_ROSTERS players from the last one kept
+    """
+    different_items = []
+    last_players = None
+    for item in items:
+        roster_players = set(players[i]['player_basketball_reference_id'] for i in item[1])
+        if last_players is not None and len(last_players - roster_players) < DIFFERENCE_BETWEEN_ROSTERS:
             continue
 
-        rosters.append({
-            'df': roster,
-            'total_salary': salary,
-            'expected_points': expected_points
-        })
+        different_items.append(item)
+        last_players = roster_players
 
-    print({
-        'rosters found': len(rosters)
-    })
+    return different_items
 
-    rosters = sorted(rosters, key=lambda d: d['expected_points'])
-    rosters.reverse()
-    rosters = rosters[0:10000]
 
-    def get_roster_players(roster):
-        return set([p['player_basketball_reference_id'] for p in roster['df']])
+def pick_lineups(df):
+    limited_n = min(len(df), N)
 
-    different_rosters = []
-    for roster in rosters:
-        if len(different_rosters) == 0:
-            different_rosters.append(roster)
-            continue
+    print({'nCk': scipy.misc.comb(limited_n, k)})
 
-        if (len(list(get_roster_players(different_rosters[-1]) - get_roster_players(roster))) < DIFFERENCE_BETWEEN_ROSTERS):
-            continue
+    sorted_players = sorted(df.to_dict(
+        'records'), key=lambda d: d['adjusted_dollars_per_fantasy_point'])
+    players = sorted_players[0:limited_n]
+    if LINEUP_PROCESSES > 1:
+        items = _find_rosters_parallel(players)
+    else:
+        items = _find_rosters(players)
+
+    print({
+        'rosters found': len(items)
+    })
 
-        different_rosters.append(roster)
+    different_items = _different_rosters(players, items)
 
     print({
-        'different rosters found': len(different_rosters)
+        'different rosters found': len(different_items)
     })
 
-    different_rosters = different_rosters[0:5]
+    different_rosters = _rosters_from_heap(players, different_items[0:LINEUPS_TO_PICK])
 
     print('\n\n\n\n')
 
@@ -25,6 +25,7 @@ from terminaltables import AsciiTable
 
 
 import data
+import model_registry
 import scraping
 
 np.random.seed(0)
@@ -32,12 +33,17 @@ os.environ['KERAS_BACKEND'] = 'plaidml.keras.backend'
 logging.basicConfig(level=logging.DEBUG)
 
 MODEL_DIR = 'tmp/models'
+MAPPERS_FILE = model_registry.MAPPERS_FILE
 
 MAX_SAMPLES = None
 BATCH_SIZE = 128
 EPOCHS = 3 if os.environ.get('FINAL', False) else 5
 PLAYER_LOSS_PLAYER_LIMIT = None
 PLAYER_MIN_NUMBER_GAMES_PLAYED=41
+# Train from the memory-mapped matrix written by `make cache-feature-matrix`
+MEMMAP = os.environ.get('MEMMAP') is not None
+# Train from batches streamed out of computed_features
+STREAM = os.environ.get('STREAM') is not None
 # PLAYER_BATCH_SIZE=64
 # PLAYER_EPOCHS = 5 if os.environ.get('FINAL', False) else 30
 
@@ -82,11 +88,18 @@ def fit(final_model=False):
     Fits the model
     '''
 
-    mapped_data = data.get_mapped_data(limit=MAX_SAMPLES)
-    x_train, x_test, y_train, y_test, sw_train, sw_test = train_test_split(
-        mapped_data['x'], mapped_data['y'], mapped_data['sw'], test_size=0.1, random_state=0)
-    x_train, x_val, y_train, y_val, sw_train, sw_val = train_test_split(
-        x_train, y_train, sw_train, test_size=0.1, random_state=0)
+    if MEMMAP:
+        mapped_data = data.load_feature_matrix(limit=MAX_SAMPLES)
+        splits = data.split_mapped_data(mapped_data, test_size=0.1, val_size=0.1)
+        x_train, y_train, sw_train = splits['train']['x'], splits['train']['y'], splits['train']['sw']
+        x_val, y_val, sw_val = splits['val']['x'], splits['val']['y'], splits['val']['sw']
+        x_test, y_test, sw_test = splits['test']['x'], splits['test']['y'], splits['test']['sw']
+    else:
+        mapped_data = data.get_mapped_data(limit=MAX_SAMPLES)
+        x_train, x_test, y_train, y_test, sw_train, sw_test = train_test_split(
+            mapped_data['x'], mapped_data['y'], mapped_data['sw'], test_size=0.1, random_state=0)
+        x_train, x_val, y_train, y_val, sw_train, sw_val = train_test_split(
+            x_train, y_train, sw_train, test_size=0.1, random_state=0)
     if final_model:
         x_train = mapped_data['x']
         y_train = mapped_data['y']
@@ -123,6 +136,58 @@ def fit(final_model=False):
     make_player_models(model, MODEL_NAME, final_model=final_model)
 
 
+def fit_streaming(final_model=False):
+    '''
+    Fits the model on batches streamed from computed_features, so the
+    dataset doesn't have to fit in memory
+    '''
+
+    splits = data.split_mapped_data(
+        {'ids': data.get_feature_ids(limit=MAX_SAMPLES)}, test_size=0.1, val_size=0.1)
+    train_ids = splits['train']['ids']
+    if final_model:
+        train_ids = np.concatenate([splits[s]['ids'] for s in ['train', 'val', 'test']])
+
+    train_batches = data.FeatureBatches(train_ids, BATCH_SIZE)
+    val_batches = data.FeatureBatches(splits['val']['ids'], BATCH_SIZE)
+    test_batches = data.FeatureBatches(
+        splits['test']['ids'], BATCH_SIZE, shuffle=False, repeat=False)
+
+    num = str(len([i for i in os.walk(MODEL_DIR)]))
+    MODEL_NAME = num + '-' + random_name.generate_name()
+    print(MODEL_NAME)
+    model = make_model(input_dim=data.get_num_features())
+    model.compile('adam', loss='mse', metrics=['mse'])
+
+    model.fit_generator(
+        iter(train_batches),
+        steps_per_epoch=len(train_batches),
+        epochs=EPOCHS,
+        verbose=1,
+        validation_data=iter(val_batches),
+        validation_steps=len(val_batches),
+        callbacks=[
+            EarlyStopping(patience=5)
+        ]
+    )
+
+    y_test, y_pred, sw_test = [], [], []
+    for x, y, sw in test_batches:
+        y_test.append(y)
+        y_pred.append(model.predict_on_batch(x))
+        sw_test.append(sw)
+    mse = mean_squared_error(
+        np.concatenate(y_test), np.concatenate(y_pred), sample_weight=np.concatenate(sw_test))
+    losses = {
+        'mse': mse,
+        'rmse': mse ** 0.5
+    }
+    print(losses)
+    save_model(model, MODEL_NAME, losses)
+
+    make_player_models(model, MODEL_NAME, final_model=final_model)
+
+
 def make_player_models(original_model, model_name, final_model=False):
     df = scraping.parse_salary_file()
 
@@ -193,10 +258,10 @@ def make_player_models(original_model, model_name, final_model=False):
             # 'mse': mse,
             # 'rmse': mse ** 0.5
         }
-        save_model(None, model_name + '/' +
-                   player_basketball_reference_id, player_losses)
         losses.append(player_losses)
 
+    save_player_losses(model_name, losses)
+
     losses = sorted(losses, key=lambda k: k['rmse_og'])
 
     table_data = [list(losses[0].keys())] + [list(l.values()) for l in losses]
@@ -205,9 +270,10 @@ def make_player_models(original_model, model_name, final_model=False):
     print(table.table)
 
 
-def predict(model, model_losses, batch):
-    mappers = data.make_mappers()
-    batch_x = np.stack([mappers.datum_to_x(datum) for datum in batch])
+def predict(model, model_losses, batch, mappers=None):
+    if mappers is None:
+        mappers = data.features_mappers()
+    batch_x = mappers.datums_to_X(data.datums_to_columns(batch))
     predictions = model.predict_on_batch(batch_x)
 
     return_batch = []
@@ -230,25 +296,41 @@ def save_model(model, model_name, losses={}):
         os.makedirs(directory)
     if model:
         model.save(directory + '/model.h5')
+        # The encoders computed_features, and so the model, was trained with
+        data.save_features_mappers(directory + '/' + MAPPERS_FILE)
     with open(directory + '/losses.json', 'w') as fp:
         json.dump(losses, fp)
 
 
+registry = model_registry.ModelRegistry(MODEL_DIR, 'model.h5', keras_load_model)
+
+
+def load_losses(model_name):
+    return registry.load_losses(model_name)
+
+
 def load_model(model_name):
-    model = None
-    try:
-        model = keras_load_model(MODEL_DIR + '/' + model_name + '/model.h5')
-    except OSError:
-        pass
-    with open(MODEL_DIR + '/' + model_name + '/losses.json', 'r') as fp:
-        losses = json.loads(fp.read())
-    return model, losses
+    return registry.load_model(model_name)
+
+
+def save_player_losses(model_name, losses):
+    registry.save_player_losses(model_name, losses)
+
+
+def load_player_losses(model_name):
+    return registry.load_player_losses(model_name)
+
+
+def load_mappers(model_name):
+    return registry.load_mappers(model_name, data.Mappers.load, data.make_mappers)
 
 
 def get_latest_model_name():
-    for root, dirs, files in os.walk(MODEL_DIR, topdown=True):
-        return sorted(dirs)[-1]
+    return registry.latest_model_name()
 
 
 if __name__ == '__main__':
-    fit(final_model=os.environ.get('FINAL', False))
+    if STREAM:
+        fit_streaming(final_model=os.environ.get('FINAL', False))
+    else:
+        fit(final_model=os.environ.get('FINAL', False))
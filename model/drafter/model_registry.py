@@ -0,0 +1,142 @@
+import collections
+import json
+import os
+import threading
+
+
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', 8))
+PLAYER_LOSSES_FILE = 'player_losses.json'
+MAPPERS_FILE = 'mappers.json'
+
+
+def _read_json(path):
+    with open(path, 'r') as fp:
+        return json.loads(fp.read())
+
+
+class ModelRegistry:
+    """
+    Loaded models and losses for one model directory, kept in a bounded LRU.
+    Entries are keyed on their file's mtime so a rewritten file is reloaded,
+    and the whole cache is dropped when a new model directory shows up
+    """
+
+    def __init__(self, model_dir, model_file, read_model, cache_size=MODEL_CACHE_SIZE):
+        self.model_dir = model_dir
+        self.model_file = model_file
+        self.read_model = read_model
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._model_dir_mtime = None
+        self._model_names = []
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _get(self, path, read):
+        mtime = self._mtime(path)
+        if mtime is None:
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._cache.move_to_end(path)
+                return entry[1]
+
+        value = read(path)
+
+        with self._lock:
+            self._cache[path] = (mtime, value)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._model_dir_mtime = None
+            self._model_names = []
+
+    def model_names(self):
+        mtime = self._mtime(self.model_dir)
+        if mtime != self._model_dir_mtime:
+            model_names = sorted([
+                d for d in os.listdir(self.model_dir)
+                if os.path.isdir(self.model_dir + '/' + d)
+            ]) if mtime is not None else []
+            with self._lock:
+                if model_names != self._model_names:
+                    self._cache.clear()
+                self._model_names = model_names
+                self._model_dir_mtime = mtime
+        return self._model_names
+
+    def latest_model_name(self):
+        model_names = self.model_names()
+        return model_names[-1] if model_names else None
+
+    def load_file(self, model_name, file_name, read):
+        return self._get(self.model_dir + '/' + model_name + '/' + file_name, read)
+
+    def load_losses(self, model_name):
+        return self._get(
+            self.model_dir + '/' + model_name + '/losses.json', _read_json)
+
+    def load_model(self, model_name):
+        model = None
+        try:
+            model = self._get(
+                self.model_dir + '/' + model_name + '/' + self.model_file,
+                self.read_model)
+        except OSError:
+            pass
+        return model, self.load_losses(model_name)
+
+    def save_player_losses(self, model_name, losses):
+        """All of a model's per-player losses, keyed by player, in one file"""
+        directory = self.model_dir + '/' + model_name
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        player_losses = {l['player_basketball_reference_id']: l for l in losses}
+        with open(directory + '/' + PLAYER_LOSSES_FILE, 'w') as fp:
+            json.dump(player_losses, fp)
+
+    def load_mappers(self, model_name, read_mappers, make_mappers):
+        """
+        The mappers saved with the model, or make_mappers() for models saved
+        before mappers were
+        """
+        try:
+            return self.load_file(model_name, MAPPERS_FILE, read_mappers)
+        except OSError:
+            return make_mappers()
+
+    def load_player_losses(self, model_name):
+        """
+        A dict of player_basketball_reference_id to losses. Models saved before
+        the index existed have a losses.json per player directory instead
+        """
+        directory = self.model_dir + '/' + model_name
+        try:
+            return self._get(directory + '/' + PLAYER_LOSSES_FILE, _read_json)
+        except OSError:
+            pass
+
+        def read_player_directories(directory):
+            player_losses = {}
+            for player_basketball_reference_id in sorted(os.listdir(directory)):
+                try:
+                    player_losses[player_basketball_reference_id] = _read_json(
+                        directory + '/' + player_basketball_reference_id + '/losses.json')
+                except OSError:
+                    continue
+            return player_losses
+
+        return self._get(directory, read_player_directories)
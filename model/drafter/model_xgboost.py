@@ -18,15 +18,19 @@ from terminaltables import AsciiTable
 
 
 import data
+import model_registry
 import scraping
 
 np.random.seed(0)
 logging.basicConfig(level=logging.DEBUG)
 
 MODEL_DIR = 'tmp/models'
+MAPPERS_FILE = model_registry.MAPPERS_FILE
 
 MAX_SAMPLES = None
 PLAYER_LOSS_PLAYER_LIMIT = None
+# Train from the memory-mapped matrix written by `make cache-feature-matrix`
+MEMMAP = os.environ.get('MEMMAP') is not None
 
 if os.environ.get('DEBUG') is not None:
     MAX_SAMPLES = 1000
@@ -60,12 +64,19 @@ def fit(final_model=False):
     MODEL_NAME = num + '-' + random_name.generate_name()
     print(MODEL_NAME)
 
-    mapped_data = data.get_mapped_data(limit=MAX_SAMPLES)
+    if MEMMAP:
+        mapped_data = data.load_feature_matrix(limit=MAX_SAMPLES)
+        splits = data.split_mapped_data(mapped_data, test_size=0.1, val_size=0.1)
+        x_train, y_train, sw_train = splits['train']['x'], splits['train']['y'], splits['train']['sw']
+        x_val, y_val, sw_val = splits['val']['x'], splits['val']['y'], splits['val']['sw']
+        x_test, y_test, sw_test = splits['test']['x'], splits['test']['y'], splits['test']['sw']
+    else:
+        mapped_data = data.get_mapped_data(limit=MAX_SAMPLES)
 
-    x_train, x_test, y_train, y_test, sw_train, sw_test = train_test_split(
-        mapped_data['x'], mapped_data['y'], mapped_data['sw'], test_size=0.1, random_state=0)
-    x_train, x_val, y_train, y_val, sw_train, sw_val = train_test_split(
-        x_train, y_train, sw_train, test_size=0.1, random_state=0)
+        x_train, x_test, y_train, y_test, sw_train, sw_test = train_test_split(
+            mapped_data['x'], mapped_data['y'], mapped_data['sw'], test_size=0.1, random_state=0)
+        x_train, x_val, y_train, y_val, sw_train, sw_val = train_test_split(
+            x_train, y_train, sw_train, test_size=0.1, random_state=0)
 
     regressor = make_model()
 
@@ -155,10 +166,10 @@ def make_player_models(original_model, model_name, final_model=False):
             # 'mse': mse,
             # 'rmse': mse ** 0.5
         }
-        save_model(None, model_name + '/' +
-                   player_basketball_reference_id, player_losses)
         losses.append(player_losses)
 
+    save_player_losses(model_name, losses)
+
     losses = sorted(losses, key=lambda k: k['rmse_og'])
 
     table_data = [list(losses[0].keys())] + [list(l.values()) for l in losses]
@@ -167,9 +178,10 @@ def make_player_models(original_model, model_name, final_model=False):
     print(table.table)
 
 
-def predict(model, model_losses, batch):
-    mappers = data.make_mappers()
-    batch_x = np.stack([mappers.datum_to_x(datum) for datum in batch])
+def predict(model, model_losses, batch, mappers=None):
+    if mappers is None:
+        mappers = data.features_mappers()
+    batch_x = mappers.datums_to_X(data.datums_to_columns(batch))
     predictions = model.predict(batch_x)
 
     return_batch = []
@@ -192,24 +204,29 @@ def save_model(model, model_name, losses={}):
         os.makedirs(directory)
     if model is not None:
         joblib.dump(model, directory + '/model.dat')
+        # The encoders computed_features, and so the model, was trained with
+        data.save_features_mappers(directory + '/' + MAPPERS_FILE)
     with open(directory + '/losses.json', 'w') as fp:
         json.dump(losses, fp)
 
 
+registry = model_registry.ModelRegistry(MODEL_DIR, 'model.dat', joblib.load)
+
+
 def load_model(model_name):
-    model = None
-    try:
-        model = joblib.load(MODEL_DIR + '/' + model_name + '/model.dat')
-    except OSError:
-        pass
-    with open(MODEL_DIR + '/' + model_name + '/losses.json', 'r') as fp:
-        losses = json.loads(fp.read())
-    return model, losses
+    return registry.load_model(model_name)
+
+
+def save_player_losses(model_name, losses):
+    registry.save_player_losses(model_name, losses)
+
+
+def load_mappers(model_name):
+    return registry.load_mappers(model_name, data.Mappers.load, data.make_mappers)
 
 
 def get_latest_model_name():
-    for root, dirs, files in os.walk(MODEL_DIR, topdown=True):
-        return sorted(dirs)[-1]
+    return registry.latest_model_name()
 
 
 if __name__ == '__main__':
@@ -16,7 +16,16 @@ import data
 # DKSalaries.csv
 
 
-def parse_salary_file():
+def parse_salary_file(path='./tmp/DKSalaries.csv'):
+    return parse_salary_rows(pd.read_csv(path))
+
+
+def parse_salary_rows(df):
+    """
+    A DraftKings salary file's rows, as a DataFrame, with their teams and time
+    of game parsed out and their player's details from the database. Players
+    not in the database are dropped
+    """
     def get_away_team(game_info):
         m = re.search(r'(\w\w\w?)@\w\w\w?', game_info)
         return data.ABBREVIATIONS[m.group(1)]
@@ -29,7 +38,7 @@ def parse_salary_file():
         m = re.search(r'\w\w\w?@\w\w\w?\s(.*)', game_info)
         return dateparser.parse(m.group(1))
 
-    df = pd.read_csv('./tmp/DKSalaries.csv')
+    df = df.copy()
     df['Position'] = df['Position'].map(lambda p: p.split('/'))
     df['Name'] = df['Name'].map(lambda n: n.strip())
     df['Roster Position'] = df['Roster Position'].map(lambda p: p.split('/'))
@@ -47,7 +56,9 @@ def parse_salary_file():
               p.birth_country,
               p.date_of_birth,
               tp.experience,
-              tp.position
+              tp.position,
+              tp.height_inches,
+              tp.weight_lbs
             from players p
             inner join teams_players tp
               on tp.player_basketball_reference_id = p.basketball_reference_id
@@ -773,6 +784,13 @@ def scrape_games():
                 _insert_games_player(
                     games_player_data, game, game_data['home_team_basketball_reference_id'], game_data['away_team_basketball_reference_id'])
 
+            data.update_player_season_stats(
+                season=game['season'],
+                player_basketball_reference_ids=[
+                    gp['player_basketball_reference_id']
+                    for gp in game_data['away_games_players'] + game_data['home_games_players']
+                ])
+
 
 memory = Memory(location='./tmp', verbose=1)
 get_lineups = memory.cache(get_lineups)
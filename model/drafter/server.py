@@ -0,0 +1,190 @@
+"""
+A long-running prediction server that keeps the mappers and models warm, so
+scoring a slate only pays for the model itself.
+
+POST /predict takes a DraftKings salary file, as text/csv or as a JSON list
+of its rows, and returns predictions for the players drafter.filter_players
+keeps
+"""
+
+import http.server
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+import drafter
+import model
+import scraping
+
+
+SERVER_HOST = os.environ.get('SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8765))
+SERVER_URL = f'http://{SERVER_HOST}:{SERVER_PORT}'
+BENCHMARK_REQUESTS = 50
+
+PREDICTION_COLUMNS = [
+    'player_basketball_reference_id',
+    'name',
+    'salary_dollars',
+    'roster_positions',
+    'dk_fantasy_points_expected',
+    'rmse',
+    '70_pct_conf',
+    'adjusted_dollars_per_fantasy_point'
+]
+
+SALARY_READERS = {
+    'text/csv': lambda body: pd.read_csv(io.StringIO(body)),
+    'application/json': lambda body: pd.DataFrame(json.loads(body))
+}
+
+
+def warm():
+    model_name = model.get_latest_model_name()
+    model.load_model(model_name)
+    model.load_player_losses(model_name)
+    model.load_mappers(model_name)
+    return model_name
+
+
+def predict_players(df):
+    """Scores players that already have the drafter's embellished columns"""
+    if len(df) == 0:
+        return []
+
+    df = df.pipe(drafter.predict_with_player_models).pipe(drafter.add_computed_columns)
+    return [
+        {c: row[c] for c in PREDICTION_COLUMNS if c in row}
+        for row in df.to_dict('records')
+    ]
+
+
+def predict_salaries(salary_df):
+    """Embellishes a salary file's rows with the warm connection, then scores them"""
+    if len(salary_df) == 0:
+        return []
+
+    df = scraping.parse_salary_rows(salary_df)
+    if len(df) == 0:
+        return []
+
+    return predict_players(df.pipe(drafter.embellish_salary_data).pipe(drafter.filter_players))
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class PredictionHandler(http.server.BaseHTTPRequestHandler):
+    def _respond(self, status, body):
+        payload = json.dumps(body, default=_to_json).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._respond(404, {'error': f'Not found: {self.path}'})
+
+        self._respond(200, {'model_name': model.get_latest_model_name()})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._respond(404, {'error': f'Not found: {self.path}'})
+
+        read = SALARY_READERS.get(self.headers.get('Content-Type', '').split(';')[0].strip())
+        if read is None:
+            return self._respond(415, {'error': 'Expected text/csv or application/json'})
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        start = time.time()
+        try:
+            predictions = predict_salaries(read(body))
+        except Exception as e:
+            return self._respond(500, {'error': repr(e)})
+
+        self._respond(200, {
+            'model_name': model.get_latest_model_name(),
+            'seconds': time.time() - start,
+            'predictions': predictions
+        })
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    # Keras models aren't safe to call from several threads, so requests are
+    # handled one at a time
+    server = http.server.HTTPServer((host, port), PredictionHandler)
+    print({'model_name': warm(), 'url': f'http://{host}:{port}'})
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Client
+
+
+def predict(salaries_csv, url=SERVER_URL):
+    """Posts the text of a DraftKings salary file to a running server"""
+    response = requests.post(
+        url + '/predict', data=salaries_csv.encode('utf-8'), headers={'Content-Type': 'text/csv'})
+    response.raise_for_status()
+    return response.json()
+
+
+def benchmark(salaries_csv, num_requests=BENCHMARK_REQUESTS, url=SERVER_URL):
+    # The first request may still be loading a newly written model
+    predict(salaries_csv, url=url)
+
+    latencies = []
+    server_latencies = []
+    for i in range(num_requests):
+        start = time.time()
+        response = predict(salaries_csv, url=url)
+        latencies.append(time.time() - start)
+        server_latencies.append(response['seconds'])
+
+    latencies = np.array(latencies) * 1000
+    server_latencies = np.array(server_latencies) * 1000
+    stats = {
+        'requests': num_requests,
+        'players': len(response['predictions']),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p90_ms': round(float(np.percentile(latencies, 90)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+        'server_p50_ms': round(float(np.percentile(server_latencies, 50)), 2)
+    }
+    print(stats)
+    return stats
+
+
+def _read_salaries(path):
+    with open(path, 'r') as fp:
+        return fp.read()
+
+
+if __name__ == '__main__':
+    arg = sys.argv[1]
+    if arg == 'serve':
+        serve()
+    elif arg == 'predict':
+        print(json.dumps(predict(_read_salaries(sys.argv[2])), indent=2))
+    elif arg == 'benchmark':
+        benchmark(
+            _read_salaries(sys.argv[2]),
+            num_requests=int(sys.argv[3]) if len(sys.argv) > 3 else BENCHMARK_REQUESTS)
+    else:
+        print(f'Argument not recognized: {arg}')
@@ -4,5 +4,15 @@ import sqlite3
 
 print(os.environ.get('SQL_WRITE_URL'))
 
-sql = sqlite3.connect(os.environ['SQL_WRITE_URL'])
-sql.row_factory = sqlite3.Row
+
+def connect(read_only=False):
+    """A new connection, for threads and processes that can't share sql"""
+    if read_only:
+        connection = sqlite3.connect(f"file:{os.environ['SQL_WRITE_URL']}?mode=ro", uri=True)
+    else:
+        connection = sqlite3.connect(os.environ['SQL_WRITE_URL'])
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+sql = connect()
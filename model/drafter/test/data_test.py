@@ -1,4 +1,12 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
 import drafter.data
+from drafter.test.helpers import insert_season, make_mappers_state, migrate
 
 
 def test_calculate_fantasy_score():
@@ -15,6 +23,575 @@ def test_calculate_fantasy_score():
     }) == 58.5
 
 
+FANTASY_SCORE_GAMES = [
+    {'seconds_played': 1800, 'points': 15, 'three_point_field_goals': 2, 'total_rebounds': 4,
+        'assists': 10, 'steals': 10, 'blocks': 1, 'turnovers': 2},
+    {'seconds_played': 2400, 'points': 30, 'three_point_field_goals': 5, 'total_rebounds': 12,
+        'assists': 3, 'steals': 1, 'blocks': 0, 'turnovers': 4},
+    {'seconds_played': 900, 'points': None, 'three_point_field_goals': None, 'total_rebounds': 10,
+        'assists': None, 'steals': 0, 'blocks': 10, 'turnovers': None},
+    {'seconds_played': 0, 'points': 0, 'three_point_field_goals': 0, 'total_rebounds': 0,
+        'assists': 0, 'steals': 0, 'blocks': 0, 'turnovers': 0},
+    {'seconds_played': None, 'points': None, 'three_point_field_goals': None, 'total_rebounds': None,
+        'assists': None, 'steals': None, 'blocks': None, 'turnovers': None},
+]
+
+
+def test_calculate_fantasy_scores():
+    scores = drafter.data.calculate_fantasy_scores_for_rows(FANTASY_SCORE_GAMES)
+
+    assert list(scores[0:4]) == [61.5, 53.5, 34.0, 0]
+    assert np.isnan(scores[4])
+
+    for score, games_player in zip(scores, FANTASY_SCORE_GAMES):
+        expected = drafter.data.calculate_fantasy_score(games_player)
+        if expected is None:
+            assert np.isnan(score)
+        else:
+            assert score == expected
+
+
+def test_calculate_fppms():
+    scores = drafter.data.calculate_fantasy_scores_for_rows(FANTASY_SCORE_GAMES)
+    fppms = drafter.data.calculate_fppms(
+        scores, [gp['seconds_played'] for gp in FANTASY_SCORE_GAMES])
+
+    for fppm, games_player in zip(fppms, FANTASY_SCORE_GAMES):
+        expected = drafter.data.calculate_fppm(games_player)
+        if expected is None:
+            assert np.isnan(fppm)
+        else:
+            assert fppm == expected
+
+
+def test_x_blobs_to_array():
+    xs = [np.array([0.1, 0.5, 0.9]), np.array([1, 2, 3])]
+    x = drafter.data.x_blobs_to_array([drafter.data.x_to_blob(x) for x in xs])
+
+    assert x.dtype == np.float32
+    assert x.shape == (2, 3)
+    assert np.array_equal(x, np.stack(xs).astype(np.float32))
+
+
+def test_split_mapped_data():
+    mapped_data = {
+        'x': np.arange(50).reshape(25, 2),
+        'y': np.arange(25).reshape(25, 1),
+        'sw': np.arange(25)
+    }
+    splits = drafter.data.split_mapped_data(mapped_data, test_size=0.1, val_size=0.1)
+
+    assert [len(splits[s]['sw']) for s in ['test', 'val', 'train']] == [3, 3, 19]
+    assert np.shares_memory(splits['train']['x'], mapped_data['x'])
+    assert sorted(np.concatenate([splits[s]['sw'] for s in splits]).tolist()) == list(range(25))
+
+
+def test_feature_ids_split_and_batches(tmp_path, monkeypatch):
+    path = str(tmp_path / 'features.db')
+
+    def connect():
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    connection = connect()
+    connection.execute('create table computed_features (id integer primary key, player_basketball_reference_id text, season int, x blob, y real, sw real)')
+    connection.executemany(
+        'insert into computed_features (id, player_basketball_reference_id, season, x, y, sw) values (?, ?, ?, ?, ?, ?)',
+        [(i, 'p', 2019, drafter.data.x_to_blob([i, i + 0.5]), i * 2, 1) for i in range(1, 26)])
+    connection.commit()
+    monkeypatch.setattr(drafter.data.services, 'sql', connection)
+    monkeypatch.setattr(drafter.data.services, 'connect', connect)
+
+    # The same split and batches as model.fit_streaming
+    splits = drafter.data.split_mapped_data(
+        {'ids': drafter.data.get_feature_ids()}, test_size=0.1, val_size=0.1)
+    assert [len(splits[s]['ids']) for s in ['test', 'val', 'train']] == [3, 3, 19]
+
+    batches = drafter.data.FeatureBatches(splits['train']['ids'], 8, shuffle=False, repeat=False)
+    assert len(batches) == 3
+    x, y, sw = map(np.concatenate, zip(*batches))
+
+    assert x.shape == (19, 2)
+    assert x[:, 0].tolist() == splits['train']['ids'].tolist()
+    assert y[:, 0].tolist() == (splits['train']['ids'] * 2).tolist()
+
+
+def test_mappers_save_and_load(tmp_path):
+    mappers = drafter.data.Mappers(make_mappers_state())
+    path = str(tmp_path) + '/mappers.json'
+    mappers.save(path)
+    loaded = drafter.data.Mappers.load(path)
+
+    assert loaded.to_state() == mappers.to_state()
+    assert loaded.teams_enc.classes_.tolist() == ['BOS', 'GSW', 'LAL']
+    assert loaded.age_enc.transform(30) == mappers.age_enc.transform(30)
+
+    with open(path, 'w') as fp:
+        json.dump({**mappers.to_state(), 'version': 0}, fp)
+    with pytest.raises(ValueError):
+        drafter.data.Mappers.load(path)
+
+
+def test_features_mappers(tmp_path, monkeypatch):
+    saved = drafter.data.Mappers(make_mappers_state())
+    path = str(tmp_path) + '/features_mappers.json'
+    saved.save(path)
+    monkeypatch.setattr(drafter.data, 'FEATURES_MAPPERS_FILE', path)
+    # Mappers rebuilt now would come from different stats
+    monkeypatch.setattr(drafter.data, 'make_mappers', lambda: None)
+    drafter.data.features_mappers.cache_clear()
+
+    assert drafter.data.features_mappers().to_state() == saved.to_state()
+
+    drafter.data.save_features_mappers(str(tmp_path) + '/model_mappers.json')
+    assert drafter.data.Mappers.load(str(tmp_path) + '/model_mappers.json').to_state() == saved.to_state()
+
+    drafter.data.features_mappers.cache_clear()
+
+
+def make_datums(n, seed=0):
+    rng = np.random.RandomState(seed)
+
+    def last_games(length, scale, as_json=False):
+        values = [
+            None if rng.rand() < 0.1 else
+            int(rng.randint(1, scale)) if rng.rand() < 0.3 else
+            float(rng.rand() * scale)
+            for i in range(rng.randint(0, length + 1))
+        ]
+        return json.dumps(values) if as_json else values
+
+    def times(length):
+        return [
+            None if rng.rand() < 0.1 else
+            f'2018-{rng.randint(10, 13)}-{rng.randint(10, 29)} 19:30:00'
+            for i in range(rng.randint(0, length + 1))
+        ]
+
+    datums = []
+    for i in range(n):
+        datums.append({
+            'age_at_time_of_game': int(rng.randint(19, 40)),
+            'height_inches': int(rng.randint(69, 90)),
+            'weight_lbs': float(rng.randint(160, 300)),
+            'experience': int(rng.randint(0, 20)),
+            'playing_at_home': [True, False, 1, 0][rng.randint(0, 4)],
+            'starter': [True, False, None][rng.randint(0, 3)],
+            'year_of_game': int(rng.randint(1984, 2020)),
+            'month_of_game': int(rng.randint(1, 13)),
+            'day_of_game': int(rng.randint(1, 32)),
+            'time_of_game': '2019-01-15 19:30:00',
+            'player_team_basketball_reference_id': ['LAL', 'BOS', 'GSW', 'NYK'][rng.randint(0, 4)],
+            'opposing_team_basketball_reference_id': ['LAL', 'BOS', 'GSW'][rng.randint(0, 3)],
+            'position': ['PG', 'SG', 'SF', 'PF', 'C'][rng.randint(0, 5)],
+            'dk_fantasy_points_last_games': last_games(12, 60, as_json=i % 2 == 0),
+            'dk_fantasy_points_last_games_against_opp_away': last_games(3, 60),
+            'dk_fantasy_points_last_games_against_opp_home': last_games(3, 60),
+            'seconds_played_last_games': last_games(12, 3000),
+            'seconds_played_last_games_against_opp_away': last_games(3, 3000),
+            'seconds_played_last_games_against_opp_home': last_games(3, 3000),
+            'dk_fantasy_points_per_minute_last_games': last_games(12, 2),
+            'dk_fantasy_points_per_minute_last_games_against_opp_away': last_games(3, 2),
+            'dk_fantasy_points_per_minute_last_games_against_opp_home': last_games(3, 2),
+            'opp_dk_fantasy_points_allowed_vs_position_last_games': last_games(12, 80),
+            'opp_dk_fantasy_points_allowed_vs_position_last_games_away': last_games(3, 80),
+            'opp_dk_fantasy_points_allowed_vs_position_last_games_home': last_games(3, 80),
+            'times_of_last_games_against_opp_away': times(3),
+            'times_of_last_games_against_opp_home': times(3) if i % 3 else None
+        })
+    return datums
+
+
+def test_datums_to_X():
+    mappers = drafter.data.Mappers(make_mappers_state())
+    datums = make_datums(200)
+
+    X = mappers.datums_to_X(drafter.data.datums_to_columns(datums))
+
+    assert X.dtype == np.float32
+    assert np.array_equal(X, np.stack([mappers.datum_to_x(d) for d in datums]))
+
+
+LAST_GAMES_EDGE_CASES = [
+    None,
+    [],
+    '[]',
+    [None, None],
+    [4],
+    [None, 0.1, 0.1, 0.1],
+    '[0.1, 0.1, 0.1, null, 0.1, 0.1, 0.1]',
+    [1, 2],
+    [3.5, None, 12.25, 7, 0.5, 19.75, 2, 8]
+]
+
+
+def test_last_games_kernels():
+    last_games = drafter.data.LastGames(LAST_GAMES_EDGE_CASES)
+
+    def identity(values):
+        return np.asarray(values, dtype=np.float64)
+
+    def scalar(fn, *args):
+        # The per-row functions round to float32, as datum_to_x does
+        return np.array([fn(*args, lg) for lg in LAST_GAMES_EDGE_CASES], dtype=np.float32)
+
+    assert np.array_equal(
+        drafter.data.last_games_transform_many(5, identity, last_games).astype(np.float32),
+        scalar(drafter.data.last_games_transform, 5, lambda v: v))
+    assert np.array_equal(
+        drafter.data.sd_last_five_games_many(last_games).astype(np.float32),
+        scalar(drafter.data.sd_last_five_games))
+    assert np.array_equal(
+        drafter.data.z_score_last_games_many(5, last_games, last_games).astype(np.float32),
+        np.array([drafter.data.z_score_last_games(5, lg, lg) for lg in LAST_GAMES_EDGE_CASES], dtype=np.float32))
+    assert np.array_equal(
+        drafter.data.avg_last_five_over_avg_all_many(last_games).astype(np.float32),
+        scalar(drafter.data.avg_last_five_over_avg_all))
+
+
+def test_last_games_to_blob():
+    assert drafter.data.last_games_to_blob(None) is None
+    assert drafter.data.last_games_to_blob('[]') is None
+
+    long_list = [8, None, 4.5, 3, 10, None, 2, 7.25, 1]
+    blobs = [
+        drafter.data.last_games_to_blob(long_list),
+        drafter.data.last_games_to_blob([None, 4, 6]),
+        None
+    ]
+    # Lists longer than the window keep aggregates over the whole list
+    assert len(blobs[0]) == 8 + 8 * (4 + drafter.data.LAST_GAMES_WINDOW)
+    assert len(blobs[1]) == 8 + 8 * 2
+
+    last_games = drafter.data.LastGames(blobs)
+    real = [v for v in long_list if v is not None]
+
+    assert last_games.lengths.tolist() == [9, 3, 0]
+    assert last_games.counts.tolist() == [7, 2, 0]
+    assert last_games.values[0].tolist() == real[0:5]
+    assert last_games.mask.sum(axis=1).tolist() == [5, 2, 0]
+    assert last_games.means().tolist() == [sum(real) / 7, 5, 0]
+    assert last_games.stdevs()[0] == pytest.approx(np.std(real, ddof=1))
+
+
+def test_cursor_to_columns():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('create table t (i integer, f real, n real, s text, b blob)')
+    connection.executemany('insert into t values (?, ?, ?, ?, ?)', [
+        (1, 1, 1.5, 'a', b'x'),
+        (2, 2, None, 'b', None),
+        (3, 2.5, 3.5, 'c', b'y')
+    ])
+
+    columns = drafter.data.cursor_to_columns(connection.execute('select * from t'), chunk_size=2)
+
+    assert columns['i'].dtype == np.int64 and columns['i'].tolist() == [1, 2, 3]
+    # A chunk of ints and a chunk of floats come out as floats
+    assert columns['f'].dtype == np.float64 and columns['f'].tolist() == [1, 2, 2.5]
+    assert columns['n'].dtype == object and columns['n'].tolist() == [1.5, None, 3.5]
+    assert columns['s'].tolist() == ['a', 'b', 'c']
+    assert columns['b'].tolist() == [b'x', None, b'y']
+
+    chunks = list(drafter.data.column_chunks(columns, 2))
+    assert [drafter.data.num_rows(c) for c in chunks] == [2, 1]
+    assert chunks[1]['s'].tolist() == ['c']
+
+    empty = drafter.data.cursor_to_columns(connection.execute('select * from t where 0'))
+    assert drafter.data.num_rows(empty) == 0
+
+
+def test_games_players_computed_writer(tmp_path):
+    columns = drafter.data.GAMES_PLAYERS_COMPUTED_COLUMNS
+    connection = sqlite3.connect(str(tmp_path / 'test.db'))
+    connection.execute(f'''
+        create table games_players_computed (
+            id integer primary key autoincrement,
+            updated_at datetime default current_timestamp not null,
+            {', '.join(columns)},
+            unique(game_basketball_reference_id, player_basketball_reference_id)
+        )
+    ''')
+
+    def gpc(game, points):
+        row = {c: None for c in columns}
+        row.update(game_basketball_reference_id=game, player_basketball_reference_id='p', dk_fantasy_points=points)
+        return row
+
+    def rows():
+        return connection.execute(
+            'select game_basketball_reference_id, dk_fantasy_points from games_players_computed order by id'
+        ).fetchall()
+
+    with drafter.data.GamesPlayersComputedWriter(connection, batch_size=2) as writer:
+        for game in ['a', 'b', 'c']:
+            writer.write(gpc(game, 1))
+        # Only full batches are written until the writer closes
+        assert rows() == [('a', 1), ('b', 1)]
+        writer.write(gpc('a', 2))
+    assert writer.written == 4
+    assert rows() == [('a', 2), ('b', 1), ('c', 1)]
+    assert connection.execute('pragma journal_mode').fetchone() == ('wal',)
+
+
+def test_compute_games_players_for_season_matches_per_row(monkeypatch):
+    connection = migrate()
+    insert_season(connection)
+    monkeypatch.setattr(drafter.data.services, 'sql', connection)
+
+    swept = {
+        (gpc['game_basketball_reference_id'], gpc['player_basketball_reference_id']): gpc
+        for gpc in drafter.data.compute_games_players_for_season(2019, connection=connection)
+    }
+
+    # What cache_single_games_player writes for each valid box score in time
+    # order, with the team the player played for in that game. It reads the
+    # points allowed by earlier games back out of games_players_computed
+    writer = drafter.data.GamesPlayersComputedWriter(connection, batch_size=1)
+    for gp in connection.execute(
+        '''
+            select gp.*, g.time_of_game, tp.team_basketball_reference_id, tp.position,
+              (case when g.home_team_basketball_reference_id = tp.team_basketball_reference_id
+                then g.away_team_basketball_reference_id else g.home_team_basketball_reference_id end) as opp_team
+            from games_players as gp
+            inner join games as g
+              on g.basketball_reference_id = gp.game_basketball_reference_id
+            inner join teams_players as tp
+              on tp.player_basketball_reference_id = gp.player_basketball_reference_id
+              and tp.season = g.season
+              and tp.team_basketball_reference_id in (g.home_team_basketball_reference_id, g.away_team_basketball_reference_id)
+            inner join player_season_stats as pss
+              on pss.player_basketball_reference_id = gp.player_basketball_reference_id
+              and pss.season = g.season
+            where g.season = 2019
+            and pss.games_played >= ?
+            and pss.avg_seconds_played >= ?
+            order by g.time_of_game asc
+        ''',
+        (drafter.data.MIN_GAMES_PLAYED_PER_SEASON, drafter.data.MIN_SECONDS_PLAYED_IN_GAME)
+    ).fetchall():
+        drafter.data.cache_single_games_player(
+            gp, gp['team_basketball_reference_id'], gp['opp_team'], 2019, gp['time_of_game'], gp['position'],
+            writer=writer)
+    writer.close()
+
+    columns = drafter.data.GAMES_PLAYERS_COMPUTED_COLUMNS
+    per_row = {
+        (r['game_basketball_reference_id'], r['player_basketball_reference_id']): {c: r[c] for c in columns}
+        for r in connection.execute(f"select {', '.join(columns)} from games_players_computed")
+    }
+
+    assert len(swept) > 200
+    assert swept.keys() == per_row.keys()
+    for key, gpc in swept.items():
+        assert {c: gpc[c] for c in columns} == per_row[key], key
+
+
+def cache_data_database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache_data.db')
+    connection = migrate(path)
+    insert_season(connection, season=2018)
+    insert_season(connection, season=2019)
+    monkeypatch.setenv('SQL_WRITE_URL', path)
+    monkeypatch.setattr(drafter.data.services, 'sql', connection)
+    monkeypatch.setattr(drafter.data, 'CACHE_DATA_PROCESSES', 2)
+    return connection
+
+
+def test_cache_data(tmp_path, monkeypatch):
+    connection = cache_data_database(tmp_path, monkeypatch)
+
+    drafter.data.cache_data()
+
+    columns = drafter.data.GAMES_PLAYERS_COMPUTED_COLUMNS
+    serial = sorted(
+        tuple(gpc[c] for c in columns)
+        for season in [2018, 2019]
+        for gpc in drafter.data.compute_games_players_for_season(season, connection=connection))
+    cached = sorted(
+        tuple(r) for r in connection.execute(f"select {', '.join(columns)} from games_players_computed"))
+    assert len(cached) > 400
+    assert cached == serial
+    assert connection.execute('select count(*) from games_players_dirty').fetchone()[0] == 0
+
+
+def _dying_cache_data_writer(rows_queue):
+    rows_queue.get()
+    os._exit(3)
+
+
+def test_cache_data_writer_dies(tmp_path, monkeypatch):
+    connection = cache_data_database(tmp_path, monkeypatch)
+    # Small enough that workers fill the queue once nothing drains it
+    monkeypatch.setattr(drafter.data, 'GAMES_PLAYERS_COMPUTED_BATCH_SIZE', 1)
+    monkeypatch.setattr(drafter.data, 'CACHE_DATA_QUEUE_SIZE', 1)
+    monkeypatch.setattr(drafter.data, '_cache_data_writer', _dying_cache_data_writer)
+
+    with pytest.raises(AssertionError, match='exited with 3'):
+        drafter.data.cache_data()
+    # Dirty rows are only cleared once the rows are in
+    assert connection.execute('select count(*) from games_players_dirty').fetchone()[0] > 0
+
+
+def test_time_of_game_is_normalized():
+    connection = migrate()
+    connection.executemany(
+        'insert into games (basketball_reference_id, time_of_game) values (?, ?)',
+        [('a', '2019-01-01 19:30:00-05:00'), ('b', '2019-01-01 20:00:00.000000'), ('c', None)])
+    connection.execute("update games set time_of_game = '2019-01-02T10:00:00' where basketball_reference_id = 'c'")
+
+    assert [tuple(r) for r in connection.execute(
+        'select basketball_reference_id, time_of_game from games order by time_of_game')] == [
+        ('b', '2019-01-01 20:00:00'),
+        ('a', '2019-01-02 00:30:00'),
+        ('c', '2019-01-02 10:00:00')
+    ]
+
+
+def test_update_player_season_stats():
+    connection = migrate()
+    connection.executemany(
+        'insert into games (basketball_reference_id, season, home_team_basketball_reference_id, away_team_basketball_reference_id) values (?, ?, ?, ?)',
+        [('g1', 2019, 'LAL', 'GSW'), ('g2', 2019, 'BOS', 'LAL')])
+    connection.executemany(
+        'insert into teams_players (player_basketball_reference_id, team_basketball_reference_id, season) values (?, ?, ?)',
+        [('jamesle01', 'LAL', 2019), ('curryst01', 'GSW', 2019)])
+    connection.executemany(
+        'insert into games_players (game_basketball_reference_id, player_basketball_reference_id, seconds_played) values (?, ?, ?)',
+        [('g1', 'jamesle01', 2000), ('g1', 'curryst01', 1800)])
+
+    def stats():
+        return [tuple(r) for r in connection.execute(
+            'select season, player_basketball_reference_id, games_played, avg_seconds_played from player_season_stats')]
+
+    drafter.data.update_player_season_stats(connection=connection)
+    assert stats() == [(2019, 'curryst01', 1, 1800), (2019, 'jamesle01', 1, 2000)]
+
+    connection.execute(
+        "insert into games_players (game_basketball_reference_id, player_basketball_reference_id, seconds_played) values ('g2', 'jamesle01', 1000)")
+    drafter.data.update_player_season_stats(
+        season=2019, player_basketball_reference_ids=['jamesle01'], connection=connection)
+    assert stats() == [(2019, 'curryst01', 1, 1800), (2019, 'jamesle01', 2, 1500)]
+
+    # Players without box scores any more lose their stats
+    connection.execute("delete from games_players where player_basketball_reference_id = 'curryst01'")
+    drafter.data.update_player_season_stats(
+        season=2019, player_basketball_reference_ids=['curryst01', 'jamesle01'], connection=connection)
+    assert stats() == [(2019, 'jamesle01', 2, 1500)]
+
+
+def test_games_players_dirty():
+    connection = migrate()
+    connection.execute(
+        "insert into games (basketball_reference_id, season, home_team_basketball_reference_id, away_team_basketball_reference_id) values ('g1', 2019, 'LAL', 'GSW')")
+    connection.execute(
+        "insert into teams_players (player_basketball_reference_id, team_basketball_reference_id, season) values ('jamesle01', 'LAL', 2019)")
+    connection.executemany(
+        'insert into games_players (game_basketball_reference_id, player_basketball_reference_id, seconds_played) values (?, ?, ?)',
+        [('g1', 'jamesle01', 2000), ('g1', 'curryst01', 1800)])
+    connection.execute("delete from games_players where player_basketball_reference_id = 'curryst01'")
+    # Games without a season have no window to dirty
+    connection.execute(
+        "insert into games (basketball_reference_id, home_team_basketball_reference_id, away_team_basketball_reference_id) values ('g2', 'LAL', 'BOS')")
+    connection.execute(
+        "insert into games_players (game_basketball_reference_id, player_basketball_reference_id, seconds_played) values ('g2', 'jamesle01', 1000)")
+    connection.execute(
+        "update teams_players set height_inches = 81 where player_basketball_reference_id = 'jamesle01'")
+
+    assert [tuple(r) for r in connection.execute(
+        'select season, player_basketball_reference_id, team_basketball_reference_id from games_players_dirty order by id')] == [
+        (2019, 'jamesle01', 'LAL'),
+        (2019, 'jamesle01', 'LAL'),
+        # Not on a roster yet
+        (2019, 'curryst01', None),
+        (2019, 'curryst01', None),
+        (2019, 'jamesle01', 'LAL')
+    ]
+
+
+def rebuild(connection):
+    """What cache_data and cache_features write, computed in process"""
+    with drafter.data.GamesPlayersComputedWriter(connection) as writer:
+        for gpc in drafter.data.compute_games_players_for_season(2019, connection=connection):
+            writer.write(gpc)
+    columns = drafter.data.cursor_to_columns(drafter.data.query_data(connection=connection))
+    with connection:
+        connection.execute('delete from computed_features')
+        drafter.data.insert_computed_features(connection, drafter.data.compute_features_rows(columns))
+
+
+def change_season(connection):
+    # A new round
+    connection.execute(
+        '''
+            insert into games (basketball_reference_id, season, home_team_basketball_reference_id, away_team_basketball_reference_id, time_of_game)
+            values ('g_new', 2019, 'NYK', 'GSW', '2019-01-30 19:30:00')
+        ''')
+    connection.executemany(
+        '''
+            insert into games_players (game_basketball_reference_id, player_basketball_reference_id, seconds_played, points, total_rebounds, assists)
+            values ('g_new', ?, ?, ?, 5, 5)
+        ''',
+        [('curryst01', 2000, 31), ('loonke01', 1500, 8), ('randlju01', 1800, 22), ('brunsja01', 2100, 25)])
+    # A corrected box score
+    connection.execute(
+        "update games_players set points = points + 10 where player_basketball_reference_id = 'tatumja01' and game_basketball_reference_id = '2019050GSW'")
+    # Feature-only changes
+    connection.execute(
+        "update teams_players set height_inches = height_inches + 2 where player_basketball_reference_id = 'horfoal01'")
+    connection.execute(
+        "update games_players set starter = not starter where player_basketball_reference_id = 'davisan02'")
+    # A player moving team
+    connection.execute(
+        "update teams_players set team_basketball_reference_id = 'NYK' where player_basketball_reference_id = 'greenda02'")
+    # A player left with too few games to be valid
+    connection.execute(
+        '''
+            delete from games_players
+            where player_basketball_reference_id = 'jamesle01'
+            and game_basketball_reference_id in (
+                select game_basketball_reference_id from games_players
+                where player_basketball_reference_id = 'jamesle01'
+                order by id limit 10
+            )
+        ''')
+    connection.commit()
+
+
+def test_refresh_data_matches_rebuild(monkeypatch):
+    mappers = drafter.data.Mappers(make_mappers_state())
+    monkeypatch.setattr(drafter.data, 'features_mappers', lambda: mappers)
+
+    refreshed = migrate()
+    insert_season(refreshed)
+    rebuild(refreshed)
+    drafter.data.clear_games_players_dirty(drafter.data.games_players_dirty_max_id(refreshed), connection=refreshed)
+    valid_before = drafter.data.get_valid_players(2019, connection=refreshed)
+
+    change_season(refreshed)
+    assert drafter.data.games_players_dirty_max_id(refreshed) > 0
+    monkeypatch.setattr(drafter.data.services, 'sql', refreshed)
+    drafter.data.refresh_data()
+
+    rebuilt = migrate()
+    insert_season(rebuilt)
+    change_season(rebuilt)
+    drafter.data.update_player_season_stats(connection=rebuilt)
+    rebuild(rebuilt)
+
+    # Moving team leaves greenda02's LAL box scores uncounted too
+    assert valid_before - drafter.data.get_valid_players(2019, connection=refreshed) == {'jamesle01', 'greenda02'}
+    for sql in [
+        'select season, player_basketball_reference_id, games_played, avg_seconds_played from player_season_stats',
+        f"select {', '.join(drafter.data.GAMES_PLAYERS_COMPUTED_COLUMNS)} from games_players_computed",
+        f"select {', '.join(drafter.data.COMPUTED_FEATURES_COLUMNS)} from computed_features"
+    ]:
+        sql += ' order by 1, 2'
+        assert [tuple(r) for r in refreshed.execute(sql)] == [tuple(r) for r in rebuilt.execute(sql)], sql
+    assert refreshed.execute('select count(*) from computed_features').fetchone()[0] > 200
+    assert refreshed.execute('select count(*) from games_players_dirty').fetchone()[0] == 0
+
+
 def test_get_stats_last_games_from_pg():
     print(drafter.data.get_stats_last_games_from_pg(
         player_basketball_reference_id='jamesle01',
@@ -0,0 +1,119 @@
+import itertools
+import random
+
+import drafter.drafter
+
+
+ROSTER_POSITIONS_BY_POSITION = {
+    'PG': ['PG', 'G', 'UTIL'],
+    'SG': ['SG', 'G', 'UTIL'],
+    'SF': ['SF', 'F', 'UTIL'],
+    'PF': ['PF', 'F', 'UTIL'],
+    'C': ['C', 'UTIL'],
+    'PG/SG': ['PG', 'SG', 'G', 'UTIL'],
+    'SF/PF': ['SF', 'PF', 'F', 'UTIL'],
+    'PF/C': ['PF', 'C', 'F', 'UTIL']
+}
+
+
+def make_players(n, seed=0, priced=False):
+    """
+    Random players, with points unrelated to salary or, when priced, roughly
+    following it like a real slate's
+    """
+    rng = random.Random(seed)
+    players = []
+    for i in range(n):
+        position = rng.choice(list(ROSTER_POSITIONS_BY_POSITION.keys()))
+        salary_dollars = rng.randrange(3000, 11000, 100)
+        players.append({
+            'player_basketball_reference_id': f'player{i:02d}',
+            'roster_positions': ROSTER_POSITIONS_BY_POSITION[position],
+            'salary_dollars': salary_dollars,
+            '70_pct_conf': max(salary_dollars / 1000 * 4.5 + rng.gauss(0, 5), 1) if priced else rng.uniform(10, 50)
+        })
+    return players
+
+
+def brute_force_rosters(players):
+    rosters = []
+    for roster in itertools.combinations(players, drafter.drafter.k):
+        salary = sum([int(d['salary_dollars']) for d in roster])
+        if salary < drafter.drafter.MIN_SPEND or salary > drafter.drafter.BUDGET:
+            continue
+
+        expected_points = sum([int(d['70_pct_conf']) for d in roster])
+        if expected_points < drafter.drafter.MIN_ACCEPTABLE_POINTS:
+            continue
+
+        if not drafter.drafter._is_valid_roster(roster):
+            continue
+
+        rosters.append({
+            'df': roster,
+            'total_salary': salary,
+            'expected_points': expected_points
+        })
+
+    rosters = sorted(rosters, key=lambda d: d['expected_points'])
+    rosters.reverse()
+    return rosters[0:drafter.drafter.ROSTERS_TO_CONSIDER]
+
+
+def test_find_rosters(monkeypatch):
+    monkeypatch.setattr(drafter.drafter, 'MIN_ACCEPTABLE_POINTS', 150)
+    players = make_players(18)
+
+    assert drafter.drafter._rosters_from_heap(
+        players, drafter.drafter._find_rosters(players)) == brute_force_rosters(players)
+
+
+def test_find_rosters_top_only(monkeypatch):
+    monkeypatch.setattr(drafter.drafter, 'MIN_ACCEPTABLE_POINTS', 100)
+    monkeypatch.setattr(drafter.drafter, 'ROSTERS_TO_CONSIDER', 25)
+    players = make_players(18, seed=1)
+
+    assert drafter.drafter._rosters_from_heap(
+        players, drafter.drafter._find_rosters(players)) == brute_force_rosters(players)
+
+
+def test_find_rosters_priced(monkeypatch):
+    monkeypatch.setattr(drafter.drafter, 'MIN_ACCEPTABLE_POINTS', 150)
+    monkeypatch.setattr(drafter.drafter, 'ROSTERS_TO_CONSIDER', 500)
+    players = make_players(20, seed=3, priced=True)
+
+    assert drafter.drafter._rosters_from_heap(
+        players, drafter.drafter._find_rosters(players)) == brute_force_rosters(players)
+
+
+def test_find_rosters_parallel(monkeypatch):
+    monkeypatch.setattr(drafter.drafter, 'MIN_ACCEPTABLE_POINTS', 100)
+    monkeypatch.setattr(drafter.drafter, 'ROSTERS_TO_CONSIDER', 25)
+    players = make_players(18, seed=2)
+
+    assert drafter.drafter._find_rosters_parallel(players, processes=2) == \
+        drafter.drafter._find_rosters(players)
+
+
+def test_different_rosters():
+    players = make_players(16)
+    items = [
+        (300, (0, 1, 2, 3, 4, 5, 6, 7), 50000),
+        (299, (0, 1, 2, 3, 4, 5, 6, 8), 50000),
+        (298, (0, 1, 10, 11, 12, 13, 14, 15), 50000),
+        (297, (0, 1, 2, 3, 4, 5, 6, 7), 50000)
+    ]
+
+    assert drafter.drafter._different_rosters(players, items) == [items[0], items[2], items[3]]
+
+
+def test_is_valid_roster():
+    # Filling slots in order would put the PF/C at PF and leave the last SG
+    # without a slot
+    roster = [{'roster_positions': ROSTER_POSITIONS_BY_POSITION[p]}
+              for p in ['PF/C', 'PG', 'PG/SG', 'PF', 'PF', 'SG', 'SG', 'SF']]
+    assert drafter.drafter._is_valid_roster(roster)
+
+    roster = [{'roster_positions': ROSTER_POSITIONS_BY_POSITION[p]}
+              for p in ['C', 'C', 'C', 'PG', 'SG', 'SF', 'PF', 'PG']]
+    assert not drafter.drafter._is_valid_roster(roster)
@@ -0,0 +1,154 @@
+"""Shared setup for the drafter tests"""
+
+import datetime
+import glob
+import os
+import random
+import sqlite3
+
+import drafter.data
+
+
+MIGRATIONS_DIR = os.path.dirname(__file__) + '/../../../rambler/migrations'
+
+
+def migrate(path=':memory:'):
+    """A connection to a database with every migration applied"""
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    for migration in sorted(glob.glob(MIGRATIONS_DIR + '/*.sql')):
+        with open(migration, 'r') as fp:
+            connection.executescript(fp.read().split('-- rambler down')[0])
+    return connection
+
+
+# A small season: four teams of three, plus a player traded from LAL to BOS,
+# playing two games a round, sometimes both at the same time
+TEAMS_PLAYERS = [
+    ('LAL', 'jamesle01', 'LeBron James', 'SF'),
+    ('LAL', 'davisan02', 'Anthony Davis', 'PF'),
+    ('LAL', 'greenda02', 'Danny Green', 'SG'),
+    ('GSW', 'curryst01', 'Stephen Curry', 'PG'),
+    ('GSW', 'greendr01', 'Draymond Green', 'PF'),
+    ('GSW', 'loonke01', 'Kevon Looney', 'C'),
+    ('BOS', 'tatumja01', 'Jayson Tatum', 'SF'),
+    ('BOS', 'brownja02', 'Jaylen Brown', 'SG'),
+    ('BOS', 'horfoal01', 'Al Horford', 'C'),
+    ('NYK', 'randlju01', 'Julius Randle', 'PF'),
+    ('NYK', 'brunsja01', 'Jalen Brunson', 'PG'),
+    ('NYK', 'robinmi01', 'Mitchell Robinson', 'C'),
+    ('LAL', 'schrode01', 'Dennis Schroder', 'PG'),
+    ('BOS', 'schrode01', 'Dennis Schroder', 'PG')
+]
+MATCHUPS = [(('LAL', 'GSW'), ('BOS', 'NYK')), (('GSW', 'BOS'), ('NYK', 'LAL')), (('BOS', 'LAL'), ('GSW', 'NYK'))]
+
+
+def insert_season(connection, season=2019, rounds=24, seed=0):
+    """
+    Inserts a synthetic season of games, rosters and box scores, and its
+    player_season_stats
+    """
+    rng = random.Random(seed)
+
+    players = {}
+    for team, player, name, position in TEAMS_PLAYERS:
+        players[player] = name
+        connection.execute(
+            '''
+                insert into teams_players (
+                    team_basketball_reference_id, player_basketball_reference_id, season,
+                    position, height_inches, weight_lbs, experience
+                )
+                values (?, ?, ?, ?, ?, ?, ?)
+            ''',
+            (team, player, season, position, rng.randint(72, 84), rng.randint(180, 260), rng.randint(0, 15)))
+    connection.executemany(
+        'insert or ignore into players (basketball_reference_id, name, date_of_birth) values (?, ?, ?)',
+        [(player, name, f'{rng.randint(1985, 1999)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}')
+         for player, name in players.items()])
+
+    rosters = {}
+    for team, player, name, position in TEAMS_PLAYERS:
+        rosters.setdefault(team, []).append(player)
+    connection.executemany(
+        'insert or ignore into teams (basketball_reference_id, name) values (?, ?)',
+        [(team, team) for team in rosters])
+
+    start = datetime.datetime(season - 1, 10, 20, 19, 30)
+    trade_round = rounds // 2 + 1
+    for r in range(rounds):
+        for i, (home, away) in enumerate(MATCHUPS[r % len(MATCHUPS)]):
+            game = f'{season}{r:02d}{i}{home}'
+            # Odd rounds tip off at the same time
+            time_of_game = start + datetime.timedelta(days=2 * r, hours=0 if r % 2 else i)
+            connection.execute(
+                '''
+                    insert into games (
+                        basketball_reference_id, season, home_team_basketball_reference_id,
+                        away_team_basketball_reference_id, time_of_game
+                    )
+                    values (?, ?, ?, ?, ?)
+                ''',
+                (game, season, home, away, time_of_game.strftime('%Y-%m-%d %H:%M:%S')))
+
+            for team in (home, away):
+                for player in rosters[team]:
+                    # The traded player plays for LAL, then BOS, and is
+                    # credited to both in the round they're traded, when LAL
+                    # and BOS play different games at the same time
+                    if player == 'schrode01' and r != trade_round and (team == 'LAL') != (r < trade_round):
+                        continue
+                    # Some games missed entirely, some barely played
+                    if rng.random() < 0.1:
+                        continue
+                    seconds_played = rng.choice([None, 0, 300]) if rng.random() < 0.1 else rng.randint(900, 2400)
+                    points = rng.randint(0, 35)
+                    connection.execute(
+                        '''
+                            insert into games_players (
+                                game_basketball_reference_id, player_basketball_reference_id, starter,
+                                seconds_played, points, three_point_field_goals, total_rebounds, assists,
+                                steals, blocks, turnovers, field_goals_attempted, free_throws_attempted,
+                                plus_minus
+                            )
+                            values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''',
+                        (game, player, rng.random() < 0.5, seconds_played, points, rng.randint(0, 5),
+                         rng.randint(0, 15), rng.randint(0, 12), rng.randint(0, 3), rng.randint(0, 3),
+                         rng.randint(0, 5), points, rng.randint(0, 10), rng.randint(-20, 20)))
+
+    connection.commit()
+    drafter.data.update_player_season_stats(connection=connection)
+
+
+MAPPERS_STATS_COLUMNS = {
+    'age_at_time_of_game': (27, 19, 40),
+    'experience': (4, 0, 20),
+    'height_inches': (79, 69, 90),
+    'weight_lbs': (220, 160, 300),
+    'year_of_game': (2000, 1984, 2019),
+    'month_of_game': (6, 1, 12),
+    'day_of_game': (15, 1, 31),
+    'seconds_played': (1200.5, 0, 3600),
+    'dk_fantasy_points_per_minute': (0.8, 0, 3.2),
+    'dk_fantasy_points_allowed_vs_position': (20.25, 0, 80),
+    'dk_fantasy_points': (18.75, -2, 95.5)
+}
+
+
+def make_mappers_state():
+    stats = {
+        'time_of_first_game': '1984-10-26 19:30:00',
+        'time_of_most_recent_game': '2019-04-10 22:30:00'
+    }
+    for column, (avg, min_value, max_value) in MAPPERS_STATS_COLUMNS.items():
+        stats[f'{column}_avg'] = avg
+        stats[f'{column}_min'] = min_value
+        stats[f'{column}_max'] = max_value
+
+    return {
+        'stats': stats,
+        'teams': ['LAL', 'BOS', 'GSW'],
+        'players': ['jamesle01', 'curryst01'],
+        'positions': ['PG', 'SG', 'SF', 'PF', 'C']
+    }
@@ -0,0 +1,110 @@
+import json
+import os
+
+import drafter.model_registry
+
+
+def write_model(model_dir, model_name, losses):
+    directory = str(model_dir) + '/' + model_name
+    os.makedirs(directory, exist_ok=True)
+    with open(directory + '/model.txt', 'w') as fp:
+        fp.write(model_name)
+    with open(directory + '/losses.json', 'w') as fp:
+        json.dump(losses, fp)
+
+
+def make_registry(model_dir, reads, cache_size=8):
+    def read_model(path):
+        reads.append(path)
+        with open(path, 'r') as fp:
+            return fp.read()
+
+    return drafter.model_registry.ModelRegistry(
+        str(model_dir), 'model.txt', read_model, cache_size=cache_size)
+
+
+def test_load_model_is_cached(tmp_path):
+    write_model(tmp_path, 'a', {'rmse': 1})
+    reads = []
+    registry = make_registry(tmp_path, reads)
+
+    assert registry.load_model('a') == ('a', {'rmse': 1})
+    assert registry.load_model('a') == ('a', {'rmse': 1})
+    assert len(reads) == 1
+
+
+def test_load_model_without_model_file(tmp_path):
+    write_model(tmp_path, 'a', {'rmse': 1})
+    os.remove(str(tmp_path) + '/a/model.txt')
+    registry = make_registry(tmp_path, [])
+
+    assert registry.load_model('a') == (None, {'rmse': 1})
+
+
+def test_cache_is_bounded(tmp_path):
+    for model_name in ['a', 'b', 'c']:
+        write_model(tmp_path, model_name, {})
+    reads = []
+    # A model and its losses take a slot each
+    registry = make_registry(tmp_path, reads, cache_size=4)
+
+    registry.load_model('a')
+    registry.load_model('b')
+    registry.load_model('a')
+    assert len(reads) == 2
+
+    registry.load_model('c')
+    registry.load_model('b')
+    assert len(reads) == 4
+
+
+def test_latest_model_name_invalidates(tmp_path):
+    write_model(tmp_path, 'a', {})
+    reads = []
+    registry = make_registry(tmp_path, reads)
+
+    assert registry.latest_model_name() == 'a'
+    registry.load_model('a')
+
+    write_model(tmp_path, 'b', {})
+    # Directory mtimes can be coarse, so force the rescan
+    registry._model_dir_mtime = None
+
+    assert registry.latest_model_name() == 'b'
+    registry.load_model('a')
+    assert len(reads) == 2
+
+
+def test_load_player_losses(tmp_path):
+    write_model(tmp_path, 'a', {})
+    write_model(tmp_path, 'a/player01', {'rmse_og': 1})
+    registry = make_registry(tmp_path, [])
+
+    assert registry.load_player_losses('a') == {'player01': {'rmse_og': 1}}
+
+    with open(str(tmp_path) + '/a/player_losses.json', 'w') as fp:
+        json.dump({'player02': {'rmse_og': 2}}, fp)
+
+    assert registry.load_player_losses('a') == {'player02': {'rmse_og': 2}}
+
+
+def test_save_player_losses(tmp_path):
+    write_model(tmp_path, 'a', {})
+    registry = make_registry(tmp_path, [])
+
+    registry.save_player_losses('a', [{'player_basketball_reference_id': 'player01', 'rmse_og': 1}])
+
+    assert registry.load_player_losses('a') == {
+        'player01': {'player_basketball_reference_id': 'player01', 'rmse_og': 1}}
+
+
+def test_load_mappers(tmp_path):
+    write_model(tmp_path, 'a', {})
+    registry = make_registry(tmp_path, [])
+
+    assert registry.load_mappers('a', drafter.model_registry._read_json, lambda: 'made') == 'made'
+
+    with open(str(tmp_path) + '/a/' + drafter.model_registry.MAPPERS_FILE, 'w') as fp:
+        json.dump({'version': 1}, fp)
+
+    assert registry.load_mappers('a', drafter.model_registry._read_json, lambda: 'made') == {'version': 1}
@@ -0,0 +1,81 @@
+import drafter.data
+from drafter.test.helpers import migrate
+
+
+class ExplainingConnection:
+    """Runs queries on a connection, keeping each one's query plan"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.plans = []
+
+    def execute(self, sql, *args):
+        self.plans.append([
+            r['detail'] for r in self.connection.execute('explain query plan ' + sql, *args)])
+        return self.connection.execute(sql, *args)
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *args):
+        return self.connection.__exit__(*args)
+
+
+def assert_no_scans(plan, tables):
+    for detail in plan:
+        for table in tables:
+            assert not detail.startswith(f'SCAN {table}'), plan
+
+
+def test_stats_last_games_plans(monkeypatch):
+    connection = ExplainingConnection(migrate())
+    monkeypatch.setattr(drafter.data.services, 'sql', connection)
+
+    drafter.data.get_stats_last_games_from_pg(
+        player_basketball_reference_id='jamesle01',
+        season=2019,
+        current_game_date='2019-01-01 00:00:00',
+        player_team='LAL',
+        opp_team='GSW',
+        player_position='SF',
+        away_team='LAL',
+        home_team='GSW'
+    )
+
+    player_plan, opp_plan = connection.plans
+    assert_no_scans(player_plan, ['g', 'gp', 'tp'])
+    assert any('games_season_time_of_game' in d for d in player_plan)
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in player_plan
+    assert_no_scans(opp_plan, ['g', 'gpc', 'tp'])
+    assert any('games_season_time_of_game' in d for d in opp_plan)
+
+
+def test_load_season_plans():
+    connection = ExplainingConnection(migrate())
+
+    drafter.data._load_season(2019, connection=connection)
+
+    games_plan, games_players_plan, teams_players_plan = connection.plans
+    assert games_plan[0].startswith('SEARCH g USING COVERING INDEX games_season_time_of_game')
+    assert_no_scans(games_players_plan, ['g'])
+
+
+def test_update_player_season_stats_plan():
+    connection = ExplainingConnection(migrate())
+
+    drafter.data.update_player_season_stats(
+        season=2019, player_basketball_reference_ids=['jamesle01', 'hardeja01'], connection=connection)
+
+    delete_plan, plan = connection.plans
+    assert_no_scans(delete_plan, ['player_season_stats'])
+    assert any(d.startswith('SEARCH gp USING COVERING INDEX games_players_player') for d in plan), plan
+    assert_no_scans(plan, ['gp', 'g', 'tp'])
+
+
+def test_valid_players_plan():
+    connection = ExplainingConnection(migrate())
+
+    drafter.data.get_valid_players(2019, connection=connection)
+
+    plan, = connection.plans
+    assert_no_scans(plan, ['pss'])
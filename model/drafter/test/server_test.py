@@ -0,0 +1,112 @@
+import copy
+import io
+import json
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+import drafter.drafter
+import drafter.server
+from drafter.test.helpers import insert_season, make_mappers_state, migrate
+
+
+SALARIES_CSV = '''Position,Name + ID,Name,ID,Roster Position,Salary,Game Info,TeamAbbrev,AvgPointsPerGame
+SF,LeBron James (1),LeBron James,1,SF/F/UTIL,10000,LAL@GS 01/30/2019 07:30PM ET,LAL,45.1
+PG,Stephen Curry (2),Stephen Curry,2,PG/G/UTIL,9500,LAL@GS 01/30/2019 07:30PM ET,GS,41.3
+C,Kevon Looney (3),Kevon Looney,3,C/UTIL,3500,LAL@GS 01/30/2019 07:30PM ET,GS,12.0
+PG,Not In The Database (4),Not In The Database,4,PG/G/UTIL,3000,LAL@GS 01/30/2019 07:30PM ET,GS,20.0
+'''
+
+
+def predict(model, model_losses, batch, mappers=None):
+    """model.predict with the network swapped for one that predicts from salary"""
+    X = mappers.datums_to_X(drafter.drafter.data.datums_to_columns(batch))
+    assert len(X) == len(batch)
+
+    return_batch = []
+    for datum in batch:
+        datum = copy.deepcopy(datum)
+        datum['_predictions'] = {'dk_fantasy_points': datum['salary_dollars'] / 250}
+        datum['_losses'] = model_losses
+        return_batch.append(datum)
+    return return_batch
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    path = str(tmp_path / 'server.db')
+    migrate(path).close()
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    insert_season(connection)
+
+    lebron = drafter.drafter.data.format_player_name('LeBron James')
+    lineups = {'LAL': {'starters': [{'team': 'LAL', 'name': lebron}], 'injured': []}}
+    mappers = drafter.drafter.data.Mappers(make_mappers_state())
+
+    monkeypatch.setattr(drafter.server, 'drafter', drafter.drafter)
+    monkeypatch.setattr(drafter.drafter.services, 'sql', connection)
+    monkeypatch.setattr(drafter.drafter.scraping, 'get_lineups', lambda date=None: lineups)
+    model = drafter.drafter.model
+    monkeypatch.setattr(model, 'get_latest_model_name', lambda: 'test-model', raising=False)
+    monkeypatch.setattr(model, 'load_model', lambda name: (None, {'rmse': 5}), raising=False)
+    monkeypatch.setattr(
+        model, 'load_player_losses', lambda name: {'jamesle01': {'rmse': 4}, 'curryst01': {'rmse': 6}},
+        raising=False)
+    monkeypatch.setattr(model, 'load_mappers', lambda name: mappers, raising=False)
+    monkeypatch.setattr(model, 'predict', predict, raising=False)
+    monkeypatch.setattr(drafter.server, 'model', model)
+
+    httpd = drafter.server.http.server.HTTPServer(('127.0.0.1', 0), drafter.server.PredictionHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+    connection.close()
+
+
+def request(url, body=None, content_type=None):
+    headers = {} if content_type is None else {'Content-Type': content_type}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers)) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health(server):
+    assert request(server + '/health') == (200, {'model_name': 'test-model'})
+
+
+def test_predict_csv(server):
+    status, body = request(server + '/predict', SALARIES_CSV.encode('utf-8'), 'text/csv')
+
+    assert status == 200
+    assert body['model_name'] == 'test-model'
+    # Looney has no model of his own and the last player isn't in the database
+    predictions = {p['player_basketball_reference_id']: p for p in body['predictions']}
+    assert sorted(predictions) == ['curryst01', 'jamesle01']
+    assert predictions['jamesle01']['dk_fantasy_points_expected'] == 40
+    assert predictions['jamesle01']['rmse'] == 4
+    assert predictions['curryst01']['roster_positions'] == ['PG', 'G', 'UTIL']
+
+
+def test_predict_json(server):
+    rows = pd.read_csv(io.StringIO(SALARIES_CSV)).to_dict('records')
+    csv_status, csv_body = request(server + '/predict', SALARIES_CSV.encode('utf-8'), 'text/csv')
+    status, body = request(server + '/predict', json.dumps(rows).encode('utf-8'), 'application/json')
+
+    assert status == 200
+    assert body['predictions'] == csv_body['predictions']
+
+
+def test_predict_unsupported_content_type(server):
+    status, body = request(server + '/predict', b'LeBron James', 'text/plain')
+
+    assert status == 415
+    assert body == {'error': 'Expected text/csv or application/json'}
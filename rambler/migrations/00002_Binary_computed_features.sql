@@ -0,0 +1,40 @@
+-- rambler up
+
+-- computed_features is a cache rebuilt by cache-features, so it's recreated
+-- rather than migrated
+drop table computed_features;
+
+create table computed_features (
+    id integer primary key autoincrement,
+    created_at datetime default current_timestamp not null,
+    updated_at datetime default current_timestamp not null,
+    game_basketball_reference_id text not null,
+    player_basketball_reference_id text not null,
+    season int not null,
+
+    -- Little-endian float32 feature vector, see data.x_blobs_to_array
+    x blob not null,
+    y real not null,
+    sw real not null default 1,
+
+    unique(game_basketball_reference_id, player_basketball_reference_id)
+);
+
+-- rambler down
+
+drop table computed_features;
+
+create table computed_features (
+    id integer primary key autoincrement,
+    created_at datetime default current_timestamp not null,
+    updated_at datetime default current_timestamp not null,
+    game_basketball_reference_id text not null,
+    player_basketball_reference_id text not null,
+    season int not null,
+
+    x text not null default '[]',
+    y text not null default '[]',
+    sw text not null default '1',
+
+    unique(game_basketball_reference_id, player_basketball_reference_id)
+);
@@ -0,0 +1,74 @@
+-- rambler up
+
+-- games_players_computed is a cache rebuilt by cache-data, so it's recreated
+-- rather than migrated. Each *_last_games blob is NULL for an empty list,
+-- otherwise little-endian: uint32 length and count of non-null values, then
+-- float64 sum, sum of squares, min and max over the whole list only when the
+-- count is over 5, then its newest 5 non-null values, newest first, as
+-- float64, see data.LastGamesWindow.
+-- times_of_last_games* keep the newest 5 times as JSON
+drop table games_players_computed;
+
+create table games_players_computed (
+    id integer primary key autoincrement,
+    created_at datetime default current_timestamp not null,
+    updated_at datetime default current_timestamp not null,
+    game_basketball_reference_id text,
+    player_basketball_reference_id text,
+    dk_fantasy_points real,
+    dk_fantasy_points_last_games blob,
+    seconds_played_last_games blob,
+    times_of_last_games text default '[]',
+    times_of_last_games_against_opp_away text default '[]',
+    times_of_last_games_against_opp_home text default '[]',
+    dk_fantasy_points_last_games_against_opp_away blob,
+    dk_fantasy_points_last_games_against_opp_home blob,
+    seconds_played_last_games_against_opp_away blob,
+    seconds_played_last_games_against_opp_home blob,
+    plus_minus_last_games blob,
+    plus_minus_last_games_against_opp_away blob,
+    plus_minus_last_games_against_opp_home blob,
+    dk_fantasy_points_per_minute real,
+    dk_fantasy_points_per_minute_last_games blob,
+    dk_fantasy_points_per_minute_last_games_against_opp_away blob,
+    dk_fantasy_points_per_minute_last_games_against_opp_home blob,
+    opp_dk_fantasy_points_allowed_vs_position_last_game_only real,
+    opp_dk_fantasy_points_allowed_vs_position_last_games blob,
+    opp_dk_fantasy_points_allowed_vs_position_last_games_home blob,
+    opp_dk_fantasy_points_allowed_vs_position_last_games_away blob,
+    unique(game_basketball_reference_id, player_basketball_reference_id)
+);
+
+-- rambler down
+
+drop table games_players_computed;
+
+create table games_players_computed (
+    id integer primary key autoincrement,
+    created_at datetime default current_timestamp not null,
+    updated_at datetime default current_timestamp not null,
+    game_basketball_reference_id text,
+    player_basketball_reference_id text,
+    dk_fantasy_points real,
+    dk_fantasy_points_last_games text default '[]',
+    seconds_played_last_games text default '[]',
+    times_of_last_games text default '[]',
+    times_of_last_games_against_opp_away text default '[]',
+    times_of_last_games_against_opp_home text default '[]',
+    dk_fantasy_points_last_games_against_opp_away text default '[]',
+    dk_fantasy_points_last_games_against_opp_home text default '[]',
+    seconds_played_last_games_against_opp_away text default '[]',
+    seconds_played_last_games_against_opp_home text default '[]',
+    plus_minus_last_games text default '[]',
+    plus_minus_last_games_against_opp_away text default '[]',
+    plus_minus_last_games_against_opp_home text default '[]',
+    dk_fantasy_points_per_minute real,
+    dk_fantasy_points_per_minute_last_games text default '[]',
+    dk_fantasy_points_per_minute_last_games_against_opp_away text default '[]',
+    dk_fantasy_points_per_minute_last_games_against_opp_home text default '[]',
+    opp_dk_fantasy_points_allowed_vs_position_last_game_only real,
+    opp_dk_fantasy_points_allowed_vs_position_last_games text default '[]',
+    opp_dk_fantasy_points_allowed_vs_position_last_games_home text default '[]',
+    opp_dk_fantasy_points_allowed_vs_position_last_games_away text default '[]',
+    unique(game_basketball_reference_id, player_basketball_reference_id)
+);
@@ -0,0 +1,56 @@
+-- rambler up
+
+-- time_of_game is kept as UTC 'YYYY-MM-DD HH:MM:SS' text, which sorts in time
+-- order, so queries can order and filter on the bare column and use an index
+-- rather than wrapping it in datetime()
+update games
+set time_of_game = datetime(time_of_game)
+where datetime(time_of_game) is not null
+and time_of_game != datetime(time_of_game);
+
+create trigger games_time_of_game_insert after insert on games
+when datetime(new.time_of_game) is not null
+and new.time_of_game != datetime(new.time_of_game)
+begin
+    update games set time_of_game = datetime(new.time_of_game) where id = new.id;
+end;
+
+create trigger games_time_of_game_update after update of time_of_game on games
+when datetime(new.time_of_game) is not null
+and new.time_of_game != datetime(new.time_of_game)
+begin
+    update games set time_of_game = datetime(new.time_of_game) where id = new.id;
+end;
+
+-- A season's games in time order, covering the team and id columns the last
+-- games queries join on
+create index games_season_time_of_game on games (
+    season,
+    time_of_game,
+    home_team_basketball_reference_id,
+    away_team_basketball_reference_id,
+    basketball_reference_id
+);
+
+-- A player's games, covering what get_valid_season_players averages
+create index games_players_player on games_players (
+    player_basketball_reference_id,
+    game_basketball_reference_id,
+    seconds_played
+);
+
+-- A player's team and position for a season
+create index teams_players_player_season on teams_players (
+    player_basketball_reference_id,
+    season,
+    team_basketball_reference_id,
+    position
+);
+
+-- rambler down
+
+drop index teams_players_player_season;
+drop index games_players_player;
+drop index games_season_time_of_game;
+drop trigger games_time_of_game_update;
+drop trigger games_time_of_game_insert;
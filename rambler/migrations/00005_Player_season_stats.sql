@@ -0,0 +1,40 @@
+-- rambler up
+
+-- Each player's games and average seconds played for a season, counting their
+-- box scores for the teams they're rostered on that season. scrape_games keeps
+-- it up to date, see data.update_player_season_stats
+create table player_season_stats (
+    player_basketball_reference_id text not null,
+    season integer not null,
+    updated_at datetime default current_timestamp not null,
+    games_played integer not null,
+    avg_seconds_played real,
+    primary key (season, player_basketball_reference_id)
+) without rowid;
+
+insert into player_season_stats (
+    player_basketball_reference_id,
+    season,
+    games_played,
+    avg_seconds_played
+)
+select
+    gp.player_basketball_reference_id,
+    tp.season,
+    count(gp.player_basketball_reference_id) as games_played,
+    avg(gp.seconds_played) as avg_seconds_played
+from games_players as gp
+inner join games as g
+    on g.basketball_reference_id = gp.game_basketball_reference_id
+inner join teams_players as tp
+    on tp.player_basketball_reference_id = gp.player_basketball_reference_id
+    and (
+        tp.team_basketball_reference_id = g.home_team_basketball_reference_id
+        or tp.team_basketball_reference_id = g.away_team_basketball_reference_id
+    )
+    and tp.season = g.season
+group by gp.player_basketball_reference_id, tp.season;
+
+-- rambler down
+
+drop table player_season_stats;
@@ -0,0 +1,70 @@
+-- rambler up
+
+-- The (season, player, team) windows touched by box scores and roster changes
+-- since the last refresh, whatever wrote them, see data.refresh_data. Games
+-- without a season have no window and are skipped
+create table games_players_dirty (
+    id integer primary key autoincrement,
+    created_at datetime default current_timestamp not null,
+    season integer not null,
+    player_basketball_reference_id text not null,
+    team_basketball_reference_id text
+);
+
+create trigger games_players_dirty_insert after insert on games_players
+begin
+    insert into games_players_dirty (season, player_basketball_reference_id, team_basketball_reference_id)
+    select g.season, new.player_basketball_reference_id, tp.team_basketball_reference_id
+    from games as g
+    left join teams_players as tp
+        on tp.player_basketball_reference_id = new.player_basketball_reference_id
+        and tp.season = g.season
+        and tp.team_basketball_reference_id in (g.home_team_basketball_reference_id, g.away_team_basketball_reference_id)
+    where g.basketball_reference_id = new.game_basketball_reference_id
+    and g.season is not null;
+end;
+
+create trigger games_players_dirty_update after update on games_players
+begin
+    insert into games_players_dirty (season, player_basketball_reference_id, team_basketball_reference_id)
+    select g.season, new.player_basketball_reference_id, tp.team_basketball_reference_id
+    from games as g
+    left join teams_players as tp
+        on tp.player_basketball_reference_id = new.player_basketball_reference_id
+        and tp.season = g.season
+        and tp.team_basketball_reference_id in (g.home_team_basketball_reference_id, g.away_team_basketball_reference_id)
+    where g.basketball_reference_id = new.game_basketball_reference_id
+    and g.season is not null;
+end;
+
+create trigger games_players_dirty_delete after delete on games_players
+begin
+    insert into games_players_dirty (season, player_basketball_reference_id, team_basketball_reference_id)
+    select g.season, old.player_basketball_reference_id, null
+    from games as g
+    where g.basketball_reference_id = old.game_basketball_reference_id
+    and g.season is not null;
+end;
+
+create trigger teams_players_dirty_insert after insert on teams_players
+when new.season is not null
+begin
+    insert into games_players_dirty (season, player_basketball_reference_id, team_basketball_reference_id)
+    values (new.season, new.player_basketball_reference_id, new.team_basketball_reference_id);
+end;
+
+create trigger teams_players_dirty_update after update on teams_players
+when new.season is not null
+begin
+    insert into games_players_dirty (season, player_basketball_reference_id, team_basketball_reference_id)
+    values (new.season, new.player_basketball_reference_id, new.team_basketball_reference_id);
+end;
+
+-- rambler down
+
+drop trigger teams_players_dirty_update;
+drop trigger teams_players_dirty_insert;
+drop trigger games_players_dirty_delete;
+drop trigger games_players_dirty_update;
+drop trigger games_players_dirty_insert;
+drop table games_players_dirty;